@@ -0,0 +1,2 @@
+from .generator import OrderFlow
+from .scenarios import SCENARIOS, Result
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import sys
+
+from .generator import OrderFlow
+from .loadgen import load
+from .scenarios import HEADER, SCENARIOS
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Time the matching engine on synthetic order flow')
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--instruments', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=15)
+    parser.add_argument('--price', type=float, default=100.0)
+    parser.add_argument('--spread', type=float, default=1.0)
+    parser.add_argument('--distribution', choices=['normal', 'uniform'], default='normal')
+    parser.add_argument('--market-ratio', type=float, default=0.05)
+    parser.add_argument('--pre-share', type=float, default=0.1, help='share of orders before 09:30')
+    parser.add_argument('--post-share', type=float, default=0.1, help='share of orders after 16:00')
+    parser.add_argument('--ratings', type=lambda s: [int(r) for r in s.split(',')], default=None, help='comma separated client ratings to draw from')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='run only these, repeatable')
+    parser.add_argument('--write', metavar='DIR', help='only write the generated clients/instruments/orders CSVs to DIR')
+    parser.add_argument('--gateway', metavar='HOST:PORT', help='instead of the scenarios, send the flow to a running gateway (test.py --serve, with the --write reference data)')
+    parser.add_argument('--sessions', type=int, default=4, help='gateway sessions')
+    parser.add_argument('--rate', type=float, default=100000, help='orders/sec sent to the gateway over all sessions')
+    args = parser.parse_args(argv)
+
+    flow = OrderFlow(
+        instruments=args.instruments,
+        clients=args.clients,
+        price=args.price,
+        spread=args.spread,
+        distribution=args.distribution,
+        market_ratio=args.market_ratio,
+        pre_share=args.pre_share,
+        post_share=args.post_share,
+        ratings=args.ratings,
+        seed=args.seed
+    )
+
+    if args.write:
+        for name, path in flow.write(args.write, args.orders).items():
+            print(f"{name}: {path}")
+        return
+
+    rows = flow.orders(args.orders)
+
+    if args.gateway:
+        host, port = args.gateway.rsplit(':', 1)
+        print(HEADER)
+        print(asyncio.run(load(host, int(port), rows, args.sessions, args.rate)))
+        return
+
+    print(HEADER)
+    for name in args.scenario or SCENARIOS:
+        results = SCENARIOS[name](flow, rows)
+        for result in results if isinstance(results, list) else [results]:
+            print(result)
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import csv
+import datetime
+import os
+import random
+
+from typing import List, TextIO
+
+
+ORDER_FIELDS = ['Time', 'OrderID', 'Instrument', 'Quantity', 'Client', 'Price', 'Side']
+
+CURRENCIES = ['SGD', 'USD', 'JPY']
+
+PRE_OPEN = (9 * 3600, 9 * 3600 + 30 * 60) # 09:00:00 - 09:30:00
+SESSION = (9 * 3600 + 30 * 60 + 1, 16 * 3600 - 1) # 09:30:01 - 15:59:59
+POST_CLOSE = (16 * 3600, 16 * 3600 + 30 * 60) # 16:00:00 - 16:30:00
+
+
+class OrderFlow:
+
+    def __init__(
+        self,
+        instruments: int = 10,
+        clients: int = 15,
+        price: float = 100.0,
+        spread: float = 1.0,
+        tick: float = 0.1,
+        distribution: str = 'normal',
+        market_ratio: float = 0.05,
+        pre_share: float = 0.1,
+        post_share: float = 0.1,
+        ratings: List[int] | None = None,
+        seed: int = 0
+    ) -> None:
+        '''
+        Synthetic order flow in the input_orders.csv schema
+        @param instruments: number of instruments
+        @param clients: number of clients
+        @param price: centre price of every instrument
+        @param spread: standard deviation (normal) or half width (uniform) of limit prices
+        @param tick: limit prices are rounded to this tick
+        @param distribution: 'normal' or 'uniform' limit price distribution
+        @param market_ratio: share of market orders
+        @param pre_share: share of orders placed before 09:30
+        @param post_share: share of orders placed after 16:00
+        @param ratings: client ratings to draw from, defaults to 1 to 10
+        @param seed: random seed, the same seed always gives the same flow
+        '''
+        if distribution not in ('normal', 'uniform'):
+            raise ValueError(f"unknown price distribution {distribution}")
+
+        self.instruments = instruments
+        self.clients = clients
+        self.price = price
+        self.spread = spread
+        self.tick = tick
+        self.distribution = distribution
+        self.market_ratio = market_ratio
+        self.pre_share = pre_share
+        self.post_share = post_share
+        self.ratings = ratings or list(range(1, 11))
+        self.seed = seed
+
+        # Every client trades every currency so generated orders are not all rejected
+        rng = random.Random(seed)
+        self.instrument_rows = [
+            {'InstrumentID': f"INST_{idx:03d}", 'Currency': CURRENCIES[idx % len(CURRENCIES)], 'LotSize': rng.choice([1, 100, 1000]), 'TickSize': tick}
+            for idx in range(instruments)
+        ]
+        self.client_rows = [
+            {'ClientID': f"CLIENT_{idx:03d}", 'Currencies': ','.join(CURRENCIES), 'PositionCheck': rng.choice(['Y', 'N']), 'Rating': rng.choice(self.ratings)}
+            for idx in range(clients)
+        ]
+
+    def limit_price(self, rng: random.Random) -> float:
+        if self.distribution == 'normal':
+            price = rng.gauss(self.price, self.spread)
+        else:
+            price = rng.uniform(self.price - self.spread, self.price + self.spread)
+        ticks = max(1, round(price / self.tick))
+        return round(ticks * self.tick, 10)
+
+    def seconds(self, rng: random.Random) -> int:
+        draw = rng.random()
+        if draw < self.pre_share:
+            return rng.randint(*PRE_OPEN)
+        if draw < self.pre_share + self.post_share:
+            return rng.randint(*POST_CLOSE)
+        return rng.randint(*SESSION)
+
+    def orders(self, count: int) -> List[dict]:
+        '''
+        count order rows, sorted by time
+        '''
+        rng = random.Random(self.seed + 1)
+        rows = []
+        for idx in range(count):
+            instrument = rng.choice(self.instrument_rows)
+            client = rng.choice(self.client_rows)
+            rows.append({
+                'Time': self.seconds(rng),
+                'OrderID': f"ORDER_{idx}",
+                'Instrument': instrument['InstrumentID'],
+                'Quantity': instrument['LotSize'] * rng.randint(1, 100),
+                'Client': client['ClientID'],
+                'Price': 'Market' if rng.random() < self.market_ratio else self.limit_price(rng),
+                'Side': rng.choice(['Buy', 'Sell']),
+            })
+
+        rows.sort(key=lambda row: row['Time'])
+        for row in rows:
+            row['Time'] = str(datetime.timedelta(seconds=row['Time'])).zfill(8)
+        return rows
+
+    def write_orders(self, out: TextIO, count: int) -> None:
+        writer = csv.DictWriter(out, fieldnames=ORDER_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.orders(count))
+
+    def write(self, directory: str, count: int) -> dict:
+        '''
+        Write input_clients.csv, input_instruments.csv and input_orders.csv into directory, returns their paths
+        '''
+        os.makedirs(directory, exist_ok=True)
+        paths = {
+            'clients': os.path.join(directory, 'input_clients.csv'),
+            'instruments': os.path.join(directory, 'input_instruments.csv'),
+            'orders': os.path.join(directory, 'input_orders.csv'),
+        }
+
+        with open(paths['clients'], 'w', newline='') as out:
+            writer = csv.DictWriter(out, fieldnames=['ClientID', 'Currencies', 'PositionCheck', 'Rating'])
+            writer.writeheader()
+            writer.writerows(self.client_rows)
+
+        with open(paths['instruments'], 'w', newline='') as out:
+            writer = csv.DictWriter(out, fieldnames=['InstrumentID', 'Currency', 'LotSize', 'TickSize'])
+            writer.writeheader()
+            writer.writerows(self.instrument_rows)
+
+        with open(paths['orders'], 'w', newline='') as out:
+            self.write_orders(out, count)
+
+        return paths
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from array import array
+from typing import Dict, List
+
+from .scenarios import Result
+
+
+async def run_session(host: str, port: int, rows: List[dict], rate: float, latencies: array) -> None:
+    '''
+    Send rows to the gateway at rate orders/sec and time each until its ACK/REJECT comes back
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    clock = time.perf_counter_ns
+    sent: Dict[str, int] = {}
+
+    async def send() -> None:
+        start = clock()
+        idx = 0
+        while idx < len(rows):
+            # everything due by now goes out in one write
+            due = min(len(rows), int((clock() - start) * rate / 1e9) + 1)
+            lines = []
+            now = clock()
+            for row in rows[idx:due]:
+                sent[row['OrderID']] = now
+                lines.append(f"New,{row['Time']},{row['OrderID']},{row['Instrument']},{row['Quantity']},{row['Client']},{row['Price']},{row['Side']}\n")
+            idx = due
+            writer.write(''.join(lines).encode())
+            await writer.drain()
+            if idx < len(rows):
+                await asyncio.sleep(max(0.0, (start + idx * 1e9 / rate - clock()) / 1e9))
+
+    async def receive() -> None:
+        answered = 0
+        while answered < len(rows):
+            line = await reader.readline()
+            if not line:
+                break
+            kind, order_id, *_ = line.decode().split(',')
+            if kind in ('ACK', 'REJECT'):
+                sent_at = sent.pop(order_id.strip(), None)
+                if sent_at is not None:
+                    latencies.append(clock() - sent_at)
+                answered += 1
+
+    await asyncio.gather(send(), receive())
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load(host: str, port: int, rows: List[dict], sessions: int = 4, rate: float = 100000) -> Result:
+    '''
+    Round trip latency of order entry through a running gateway
+    @param rows: order rows, dealt round robin over the sessions
+    @param rate: total orders/sec over all sessions
+    '''
+    latencies = array('q')
+    start = time.perf_counter_ns()
+    await asyncio.gather(*(
+        run_session(host, port, rows[idx::sessions], rate / sessions, latencies)
+        for idx in range(sessions)
+    ))
+    return Result('gateway round trip', len(latencies), time.perf_counter_ns() - start, latencies)
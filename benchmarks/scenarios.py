@@ -0,0 +1,342 @@
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from array import array
+from typing import Callable, List
+
+from classes.client import generateClientReport
+from classes.instrument import generate_instrument_report
+from classes.order import AuctionOrder, Order, OrderBook, generateExchangeReport
+from classes.exchange import Exchange
+from classes.ingest import dispatch_batches, parse_rows, read_orders as read_csv_orders
+from classes.orderfile import OrderFile, convert_orders
+from classes.refdata import client_from_row, instrument_from_row
+from classes.marketdata import DepthPublisher
+from classes.metrics import Metrics
+from classes.clock import SimulatedClock
+from classes.replay import Replay
+
+from .generator import OrderFlow
+
+
+class Result:
+    __slots__ = ('name', 'count', 'elapsed_ns', 'latencies', 'peak')
+
+    def __init__(self, name: str, count: int, elapsed_ns: int, latencies: array, peak: int | None = None) -> None:
+        '''
+        Timing of one scenario
+        @param count: orders (or calls) processed
+        @param elapsed_ns: total wall time
+        @param latencies: per-call latencies in ns
+        @param peak: peak traced memory in bytes, None if not measured
+        '''
+        self.name = name
+        self.count = count
+        self.elapsed_ns = elapsed_ns
+        self.latencies = latencies
+        self.peak = peak
+
+    @property
+    def per_second(self) -> float:
+        return self.count / (self.elapsed_ns / 1e9) if self.elapsed_ns else 0.0
+
+    def percentile(self, pct: float) -> float:
+        '''
+        Per-call latency percentile in microseconds
+        '''
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] / 1000
+
+    def __str__(self) -> str:
+        peak = f"{self.peak / (1 << 20):10.1f}" if self.peak is not None else f"{'-':>10}"
+        return f"{self.name:<28}{self.count:>10}{self.per_second:>14.0f}{self.percentile(50):>10.1f}{self.percentile(99):>10.1f}{peak}"
+
+
+HEADER = f"{'scenario':<28}{'count':>10}{'per sec':>14}{'p50 us':>10}{'p99 us':>10}{'peak MiB':>10}"
+
+
+class Market(Exchange):
+
+    def __init__(self, flow: OrderFlow, dense_width: int | None = None, metrics: Metrics | None = None, clock: SimulatedClock | None = None) -> None:
+        '''
+        Exchange of fresh clients, instruments and books for a generated order flow
+        @param dense_width: if set, the books use DenseLadders this many ticks wide
+        @param metrics: if set, the books record their stage latencies and counters in it
+        @param clock: if set, the books run on this simulated clock
+        '''
+        super().__init__(
+            {row['InstrumentID']: instrument_from_row(row) for row in flow.instrument_rows},
+            {row['ClientID']: client_from_row(row) for row in flow.client_rows},
+            dense_width=dense_width, metrics=metrics, clock=clock
+        )
+
+    def orders(self, rows: List[dict]) -> List[Order]:
+        return [order for _, order in parse_rows(rows, self.clients, self.instruments)]
+
+
+def timed(name: str, items: list, call: Callable) -> Result:
+    '''
+    Time call(item) for every item
+    '''
+    latencies = array('q')
+    clock = time.perf_counter_ns
+    start = clock()
+    for item in items:
+        t0 = clock()
+        call(item)
+        latencies.append(clock() - t0)
+    return Result(name, len(items), clock() - start, latencies)
+
+
+def peak_memory(run: Callable) -> int:
+    '''
+    Peak traced allocation of run(), in bytes
+    '''
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def process_order(flow: OrderFlow, rows: List[dict], metrics: bool = False) -> Result:
+    '''
+    Full order entry path, risk check, auction capture, matching and resting
+    @param metrics: run with stage instrumentation on, to measure its overhead
+    '''
+    name = 'process_order metrics' if metrics else 'process_order'
+
+    def setup():
+        market = Market(flow, metrics=Metrics() if metrics else None)
+        return market, market.orders(rows)
+
+    def run(market, orders):
+        books = market.orderbooks
+        return timed(name, orders, lambda o: books[o.instrument.instrumentID].process_order(o, o.rating))
+
+    result = run(*setup())
+    result.peak = peak_memory(lambda: run(*setup()))
+    return result
+
+
+def process_orders(flow: OrderFlow, rows: List[dict], batch: int = 1000) -> Result:
+    '''
+    process_order's flow handed over in batches, latencies are per batch
+    '''
+    def setup():
+        market = Market(flow)
+        orders = [('New', order) for order in market.orders(rows)]
+        return market, [orders[idx:idx + batch] for idx in range(0, len(orders), batch)]
+
+    def run(market, batches):
+        books = market.orderbooks
+        result = timed(f'process_orders({batch})', batches, lambda pairs: dispatch_batches(pairs, books, batch))
+        result.count = len(rows)
+        return result
+
+    result = run(*setup())
+    result.peak = peak_memory(lambda: run(*setup()))
+    return result
+
+
+def process_match(flow: OrderFlow, rows: List[dict], dense_width: int | None = None) -> Result:
+    '''
+    Sweeps only, a book of passive orders either side of the centre price hit by orders crossing it
+    '''
+    name = 'process_match' if dense_width is None else f'process_match dense({dense_width})'
+
+    def setup():
+        market = Market(flow, dense_width)
+        orders = market.orders(rows)
+        resting = orders[:len(orders) // 2]
+        aggressive = orders[len(orders) // 2:]
+
+        for order in resting:
+            if order.price is None:
+                continue
+            # buys below the centre, sells above, so the book never crosses
+            ticks = order.instrument.ticks
+            order.price = min(order.price, ticks.to_ticks(flow.price) - 1) if order.side else max(order.price, ticks.to_ticks(flow.price) + 1)
+            market.orderbooks[order.instrument.instrumentID].rest_order(order, order.rating)
+
+        for order in aggressive:
+            ticks = order.instrument.ticks
+            order.price = ticks.to_ticks(flow.price) + round(flow.spread * 3 / flow.tick) * (1 if order.side else -1)
+
+        return market, aggressive
+
+    def run(market, aggressive):
+        books = market.orderbooks
+        return timed(name, aggressive, lambda o: books[o.instrument.instrumentID].process_match(o, o.rating))
+
+    result = run(*setup())
+    result.peak = peak_memory(lambda: run(*setup()))
+    return result
+
+
+def market_data(flow: OrderFlow, rows: List[dict]) -> Result:
+    '''
+    Full order entry path with 10-level depth deltas published after every change
+    '''
+    def setup():
+        market = Market(flow)
+        publisher = DepthPublisher(levels=10)
+        publisher.subscribe(lambda message: None)
+        for book in market.orderbooks.values():
+            publisher.attach(book)
+        return market, market.orders(rows)
+
+    def run(market, orders):
+        books = market.orderbooks
+        return timed('market_data', orders, lambda o: books[o.instrument.instrumentID].process_order(o, o.rating))
+
+    result = run(*setup())
+    result.peak = peak_memory(lambda: run(*setup()))
+    return result
+
+
+def replay(flow: OrderFlow, rows: List[dict]) -> Result:
+    '''
+    The flow as a recorded day, on a simulated clock as fast as possible, order events sorted by time
+    '''
+    def setup():
+        clock = SimulatedClock()
+        market = Market(flow, clock=clock)
+        orders = sorted(market.orders(rows), key=lambda o: o.time)
+        return Replay(market.orderbooks, clock), orders
+
+    def run(driver, orders):
+        # timed one event at a time through the pacing generator, like the file path feeds it
+        paced = driver.paced(('New', order) for order in orders)
+        books = driver.orderbooks
+
+        def step(_):
+            _, order = next(paced)
+            books[order.instrument.instrumentID].process_order(order, order.rating)
+
+        return timed('replay', orders, step)
+
+    result = run(*setup())
+    result.peak = peak_memory(lambda: run(*setup()))
+    return result
+
+
+def calculate_auction_price(flow: OrderFlow, rows: List[dict], batch: int = 1000) -> Result:
+    '''
+    Uncrossing price of batches of auction orders
+    '''
+    def setup():
+        orders = [AuctionOrder(order) for order in Market(flow).orders(rows)]
+        return [orders[idx:idx + batch] for idx in range(0, len(orders), batch)]
+
+    def run(batches):
+        book = OrderBook(None)
+        result = timed('calculate_auction_price', batches, book.calculate_auction_price)
+        result.count = sum(len(b) for b in batches) # orders, latency stays per batch
+        return result
+
+    result = run(setup())
+    result.peak = peak_memory(lambda: run(setup()))
+    return result
+
+
+def reports(flow: OrderFlow, rows: List[dict]) -> List[Result]:
+    '''
+    The three end of day reports, after running the whole flow
+    '''
+    market = Market(flow)
+    for order in market.orders(rows):
+        market.orderbooks[order.instrument.instrumentID].process_order(order, order.rating)
+
+    generators = [
+        ('generateClientReport', generateClientReport, market.clients.values()),
+        ('generate_instrument_report', generate_instrument_report, market.instruments.values()),
+        ('generateExchangeReport', generateExchangeReport, market.orderbooks.values()),
+    ]
+
+    results = []
+    # Report paths are relative to the working directory
+    with tempfile.TemporaryDirectory() as workdir, contextlib.chdir(workdir):
+        os.mkdir('reports')
+        for name, generator, items in generators:
+            result = timed(name, [items], generator)
+            result.peak = peak_memory(lambda: generator(items))
+            results.append(result)
+    return results
+
+
+def read_orders(flow: OrderFlow, rows: List[dict]) -> List[Result]:
+    '''
+    Order file parsing alone, the CSV file against its binary conversion, latencies are per order
+    '''
+    market = Market(flow)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, 'input_orders.csv')
+        binary_path = os.path.join(workdir, 'input_orders.bin')
+        with open(csv_path, 'w', newline='') as out:
+            flow.write_orders(out, len(rows))
+        with open(csv_path, newline='') as inf:
+            convert_orders(inf, binary_path)
+
+        def read_csv():
+            with open(csv_path, newline='') as inf:
+                return list(read_csv_orders(inf, market.clients, market.instruments))
+
+        def read_binary():
+            with OrderFile(binary_path) as orders:
+                return list(orders.read_orders(market.clients, market.instruments))
+
+        for name, read in (('read_orders csv', read_csv), ('read_orders binary', read_binary)):
+            start = time.perf_counter_ns()
+            count = len(read())
+            result = Result(name, count, time.perf_counter_ns() - start, array('q'))
+            result.peak = peak_memory(read)
+            results.append(result)
+    return results
+
+
+# What a short-lived worker does before its first order
+STARTUP = '''
+import sys
+from classes.refdata import load_clients, load_instruments
+from classes.order import OrderBook
+from classes.ingest import dispatch
+instruments = load_instruments(sys.argv[2])
+clients = load_clients(sys.argv[1])
+orderbooks = {iid: OrderBook(iid, ticks=instrument.ticks) for iid, instrument in instruments.items()}
+'''
+
+
+def startup(flow: OrderFlow, rows: List[dict], runs: int = 20) -> Result:
+    '''
+    Cold start of a fresh interpreter, engine imports, reference data and empty books
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = flow.write(workdir, 0)
+        command = [sys.executable, '-c', STARTUP, paths['clients'], paths['instruments']]
+        return timed('startup', range(runs), lambda _: subprocess.run(command, cwd=root, check=True))
+
+
+SCENARIOS = {
+    'process_order': process_order,
+    'process_order_metrics': lambda flow, rows: process_order(flow, rows, metrics=True),
+    'process_orders': process_orders,
+    'process_match': process_match,
+    'process_match_dense': lambda flow, rows: process_match(flow, rows, dense_width=1024),
+    'market_data': market_data,
+    'replay': replay,
+    'calculate_auction_price': calculate_auction_price,
+    'reports': reports,
+    'read_orders': read_orders,
+    'startup': startup,
+}
@@ -0,0 +1,155 @@
+from typing import Iterable, List, Tuple
+
+from .optional import optional_import
+
+
+# Below this many orders the NumPy setup costs more than it saves
+NUMPY_THRESHOLD = 256
+
+
+class AuctionResult:
+    __slots__ = ('price', 'volume', 'demand', 'supply')
+
+    def __init__(self, price: float, volume: float, demand: float, supply: float) -> None:
+        '''
+        Outcome of an uncross
+        @param price: uncrossing price
+        @param volume: executable volume at price
+        @param demand: buy quantity willing to trade at price
+        @param supply: sell quantity willing to trade at price
+        '''
+        self.price = price
+        self.volume = volume
+        self.demand = demand
+        self.supply = supply
+
+    @property
+    def imbalance(self) -> float:
+        """
+        Unexecuted surplus at price, positive on the buy side
+        """
+        return self.demand - self.supply
+
+    def __str__(self) -> str:
+        return f"{self.volume} @ {self.price} (imbalance {self.imbalance})"
+
+
+def uncross(buys: Iterable[Tuple[float | None, float]], sells: Iterable[Tuple[float | None, float]], reference_price: float | None = None) -> AuctionResult | None:
+    '''
+    Find the price maximising executable volume between buy and sell interest
+
+    Ties are broken by the smallest imbalance, then market pressure (highest price if the
+    surplus is all on the buy side, lowest if it is all on the sell side), then the price
+    closest to reference_price. Returns None when nothing can execute.
+    @param buys: (limit price, quantity) pairs, price None=market order
+    @param sells: (limit price, quantity) pairs, price None=market order
+    @param reference_price: optional last/previous price for the final tie-break
+    '''
+    buy_prices, buy_qty, market_buy = _split(buys)
+    sell_prices, sell_qty, market_sell = _split(sells)
+
+    if not buy_prices and not sell_prices: # market orders only, they can only trade at the reference
+        volume = min(market_buy, market_sell)
+        if reference_price is None or volume <= 0:
+            return None
+        return AuctionResult(reference_price, volume, market_buy, market_sell)
+
+    # optional, pure Python fallback below
+    if len(buy_prices) + len(sell_prices) >= NUMPY_THRESHOLD and optional_import('numpy') is not None:
+        prices, demand, supply = _curves_numpy(buy_prices, buy_qty, market_buy, sell_prices, sell_qty, market_sell)
+    else:
+        prices, demand, supply = _curves(buy_prices, buy_qty, market_buy, sell_prices, sell_qty, market_sell)
+
+    return _choose(prices, demand, supply, reference_price)
+
+
+def _split(orders: Iterable[Tuple[float | None, float]]) -> Tuple[List[float], List[float], float]:
+    prices = []
+    quantities = []
+    market = 0
+    for price, qty in orders:
+        if price is None:
+            market += qty
+        else:
+            prices.append(price)
+            quantities.append(qty)
+    return prices, quantities, market
+
+
+def _curves(buy_prices, buy_qty, market_buy, sell_prices, sell_qty, market_sell) -> Tuple[list, list, list]:
+    '''
+    Cumulative demand and supply at every limit price, in one sorted pass
+    '''
+    bids = {}
+    for price, qty in zip(buy_prices, buy_qty):
+        bids[price] = bids.get(price, 0) + qty
+
+    offers = {}
+    for price, qty in zip(sell_prices, sell_qty):
+        offers[price] = offers.get(price, 0) + qty
+
+    prices = sorted(bids.keys() | offers.keys())
+
+    # buyers trade at or below their limit, so demand accumulates from the top
+    demand = [0] * len(prices)
+    total = market_buy
+    for idx in range(len(prices) - 1, -1, -1):
+        total += bids.get(prices[idx], 0)
+        demand[idx] = total
+
+    # sellers trade at or above their limit, so supply accumulates from the bottom
+    supply = [0] * len(prices)
+    total = market_sell
+    for idx, price in enumerate(prices):
+        total += offers.get(price, 0)
+        supply[idx] = total
+
+    return prices, demand, supply
+
+
+def _curves_numpy(buy_prices, buy_qty, market_buy, sell_prices, sell_qty, market_sell) -> Tuple[list, list, list]:
+    '''
+    Vectorised _curves, only the prices tied on maximum volume are handed back as lists
+    '''
+    np = optional_import('numpy')
+    # integer tick prices stay int64, so the price comes back an int as it does from _curves
+    bp = np.asarray(buy_prices) if buy_prices else np.empty(0, dtype=np.int64)
+    sp = np.asarray(sell_prices) if sell_prices else np.empty(0, dtype=np.int64)
+    prices = np.unique(np.concatenate((bp, sp)))
+
+    bids = np.bincount(np.searchsorted(prices, bp), weights=np.asarray(buy_qty, dtype=np.float64), minlength=len(prices))
+    offers = np.bincount(np.searchsorted(prices, sp), weights=np.asarray(sell_qty, dtype=np.float64), minlength=len(prices))
+
+    demand = market_buy + np.cumsum(bids[::-1])[::-1]
+    supply = market_sell + np.cumsum(offers)
+
+    volume = np.minimum(demand, supply)
+    tied = np.flatnonzero(volume == volume.max())
+
+    return prices[tied].tolist(), demand[tied].tolist(), supply[tied].tolist()
+
+
+def _choose(prices: list, demand: list, supply: list, reference_price: float | None) -> AuctionResult | None:
+    volume = [min(d, s) for d, s in zip(demand, supply)]
+    best = max(volume)
+    if best <= 0:
+        return None
+
+    candidates = [idx for idx, v in enumerate(volume) if v == best]
+
+    least = min(abs(demand[idx] - supply[idx]) for idx in candidates)
+    candidates = [idx for idx in candidates if abs(demand[idx] - supply[idx]) == least]
+
+    if len(candidates) > 1:
+        surplus = [demand[idx] - supply[idx] for idx in candidates]
+        if all(s > 0 for s in surplus):
+            candidates = [candidates[-1]]
+        elif all(s < 0 for s in surplus):
+            candidates = [candidates[0]]
+        elif reference_price is not None:
+            candidates = [min(candidates, key=lambda idx: (abs(prices[idx] - reference_price), prices[idx]))]
+        else:
+            candidates = [candidates[(len(candidates) - 1) // 2]]
+
+    idx = candidates[0]
+    return AuctionResult(prices[idx], volume[idx], demand[idx], supply[idx])
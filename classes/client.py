@@ -1,24 +1,28 @@
-import os, logging, csv
+import os, logging
+
+from typing import Mapping
+
 from .order import Order
 from .instrument import Instrument
 from .errors import *
+from .report import CLIENT_HEADER, client_columns, write_table
 
 
+# Defaults only, nothing is read or written at import
 inputClientPath = os.path.join('classes', 'csv', 'example', 'input_clients.csv')
 outputClientPath = os.path.join('reports', 'output_client_report.csv')
-data = csv.DictReader(open(inputClientPath))
-global INSTRUMENTS
-INSTRUMENTS = set(['SIA', 'AMD'])
 
 class Client:
 
-    def __init__(self, ID: str, currencies: set[str], positionCheck: bool, rating: int) -> None:
+    def __init__(self, ID: str, currencies: set[str], positionCheck: bool, rating: int, maxNotional: float | None = None, maxOrderRate: int | None = None) -> None:
         '''
         Class representing a single client
         @param ID: str
         @param currencies: Set of strings
         @param positionCheck: boolean
         @param rating: int
+        @param maxNotional: optional limit on price * quantity of a single order
+        @param maxOrderRate: optional limit on orders per second, by order time
         '''
         self.ID = ID
         self.currencies = currencies
@@ -39,81 +43,129 @@ class Client:
         """
         self.positions: dict[str:dict[float:int]] = {}
 
+        # Running totals kept by updatePosition/updateOpenSells, so checks never scan positions
+        # instrumentID : net quantity
+        self.netPositions: dict[str:int] = {}
+        # instrumentID : quantity of market sells resting in a call phase, not booked in netPositions until they fill
+        self.openSells: dict[str:int] = {}
+
+        self.maxNotional = maxNotional
+        self.maxOrderRate = maxOrderRate
+        self.rateSecond = None # order time second being counted
+        self.rateCount: int = 0
+
 
     def __str__(self):
         # return f"{self.ID}: Allowed: [{self.currencies}] PosCheck: {self.positionCheck} Rating {self.rating}"
         return self.ID
 
-    def checkOrder(self, order: Order):
+    def checkOrder(self, order: Order, registry: Mapping[str, Instrument] | None = None) -> type[Rejection] | None:
+        '''
+        Pre-trade checks, returns the rejection reason or None if the order is accepted
+        @param registry: InstrumentID -> Instrument listed on the exchange the order is sent to, None skips the instrument check
+        '''
+        return self.checkStatic(order, registry) or self.checkLimits(order)
 
-        if order.instrument.instrumentID not in Instrument.INSTRUMENTS:
-            raise InstrumentNotFound("REJECTED - INSTRUMENT NOT FOUND")
+    def checkStatic(self, order: Order, registry: Mapping[str, Instrument] | None = None) -> type[Rejection] | None:
+        '''
+        Checks that do not depend on the client's positions, order rate, instrument, currency and lot size
+
+        Only the rate counter keeps state, so orders must be checked in arrival order, but a whole
+        batch can be checked before any of it is processed.
+        @param registry: as for checkOrder
+        '''
+        if self.maxOrderRate is not None:
+            if order.time == self.rateSecond:
+                self.rateCount += 1
+            else:
+                self.rateSecond = order.time
+                self.rateCount = 1
+            if self.rateCount > self.maxOrderRate:
+                return RateLimit
+
+        if registry is not None and order.instrument.instrumentID not in registry:
+            return InstrumentNotFound
 
         if order.instrument.currency not in self.currencies:
-            raise MismatchCurrency("REJECTED - MISMATCH CURRENCY")
+            return MismatchCurrency
 
         if order.quantity % order.instrument.lotSize != 0:
-            raise InvalidSize("REJECTED - INVALID LOT SIZE")
+            return InvalidSize
+
+        return None
+
+    def checkLimits(self, order: Order) -> type[Rejection] | None:
+        '''
+        Position and notional checks, run when the order reaches the book
+        '''
+        if not order.side and self.positionCheck:
+            net = self.netPositions.get(order.instrument.instrumentID)
+            if net is not None and net - self.openSells.get(order.instrument.instrumentID, 0) < order.quantity:
+                return PositionCheck
 
-        if not order.side and self.positionCheck and order.instrument.instrumentID in self.positions and sum(self.positions[order.instrument.instrumentID].values()) < order.quantity:
-            raise PositionCheck("REJECTED - POSITION CHECK FAILED")
+        if self.maxNotional is not None and order.price is not None and order.instrument.ticks.to_price(order.price) * order.quantity > self.maxNotional:
+            return NotionalLimit
 
-        return True
+        return None
 
 
-    def updatePosition(self, instrument: Instrument, price: float, qty: int) -> dict[float:int]:
+    def updatePosition(self, instrument: Instrument, price: int, qty: int) -> dict[int:int]:
         """
         Updates a client's position based on order. Returns position held by client for that particular instrument.
         """
 
         if instrument.instrumentID in self.positions:
             self.positions[instrument.instrumentID][price] = qty + self.positions[instrument.instrumentID].setdefault(price, 0)
+            self.netPositions[instrument.instrumentID] += qty
 
         else:
             self.positions[instrument.instrumentID] = {price : qty}
+            self.netPositions[instrument.instrumentID] = qty
         
         return self.positions[instrument.instrumentID]
 
+    def updateOpenSells(self, instrument: Instrument, qty: int) -> int:
+        """
+        Adjusts the quantity of unbooked market sells the client has resting in a call phase. Returns the new open sell quantity for that instrument.
+        """
+        total = self.openSells.get(instrument.instrumentID, 0) + qty
+        self.openSells[instrument.instrumentID] = total
+        return total
+
 
     def generateReportRows(self) -> list[dict[str:str|int]]:
         """
-        Returns a list of objects with keys being the header of the client report
+        Returns a list of objects with keys being the header of the client report, by InstrumentID so the
+        rows do not depend on the order the books were processed in (batches, --workers)
 
         example:
         [
-            {
-                'InstrumentID' : 'SIA',
-                'NetPosition' : 123
-            },
             {
                 'InstrumentID' : 'AMD',
                 'NetPosition' : -213
             },
+            {
+                'InstrumentID' : 'SIA',
+                'NetPosition' : 123
+            },
             ...
         ]
         """
 
         clientRows = []
-        for instrument, fulfilled in self.positions.items():
+        for instrument, net in sorted(self.netPositions.items()):
             clientRows.append({
                 'ClientID' : self.ID,
                 'InstrumentID' : instrument,
-                'NetPosition' : sum(fulfilled.values())
+                'NetPosition' : net
             })
         
         return clientRows
 
 
 def main():
-    test = []
-    for row in data:
-        newclient = Client(
-                    ID= row['ClientID'],
-                    currencies= set(row['Currencies'].split(',')),
-                    positionCheck= True if row['PositionCheck'] == 'Y' else False,
-                    rating= int(row['Rating'])
-                )
-        test.append(newclient)
+    from .refdata import load_clients # refdata builds Clients, imported here to avoid the cycle
+    test = load_clients(inputClientPath).values()
 
     for c in test:
         attrs = vars(c)
@@ -125,20 +177,5 @@ if __name__ == "__main__":
     main()
 
 
-def generateClientReport(clients: list[Client]):
-
-    with open(outputClientPath, 'w') as report:
-        
-        fieldnames = ['ClientID', 'InstrumentID', 'NetPosition']
-        writer = csv.DictWriter(report, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for c in clients:
-            try: 
-                logging.info(f"Writing for client {c.ID}...")
-                writer.writerows(c.generateReportRows())
-            except Exception as e:
-                logging.error(f"Error occured when writing: {e}")
-
-    logging.info('Completed report.')
-    return
\ No newline at end of file
+def generateClientReport(clients: list[Client], path: str = outputClientPath):
+    write_table(path, CLIENT_HEADER, client_columns(clients))
@@ -0,0 +1,88 @@
+import datetime
+import time
+
+from functools import lru_cache
+
+
+# Order times are times of day, carried on 1900-01-01 as strptime(value, "%H:%M:%S") gives them
+MIDNIGHT = datetime.datetime(1900, 1, 1)
+
+
+@lru_cache(maxsize=24 * 60 * 60)
+def parse_time(value: str) -> datetime.datetime:
+    '''
+    Fixed format H:MM:SS / HH:MM:SS parser, same result as strptime(value, "%H:%M:%S")
+
+    Order files only ever hold times of day, so every distinct string is parsed once and cached
+    '''
+    hour, minute, second = value.split(':')
+    if len(minute) != 2 or len(second) != 2:
+        raise ValueError(f"time data {value!r} does not match format '%H:%M:%S'")
+    return datetime.datetime(1900, 1, 1, int(hour), int(minute), int(second))
+
+
+def seconds_of_day(time: datetime.datetime) -> int:
+    '''
+    Whole seconds since midnight of an order time, how binary files and columns store it
+    '''
+    return time.hour * 3600 + time.minute * 60 + time.second
+
+
+@lru_cache(maxsize=24 * 60 * 60)
+def time_of_day(seconds: int) -> datetime.datetime:
+    '''
+    Order time of a seconds_of_day value
+    '''
+    return MIDNIGHT + datetime.timedelta(seconds=seconds)
+
+
+class WallClock:
+    '''
+    The machine's clock, what books use outside of a replay
+    '''
+    simulated = False
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now()
+
+    def advance(self, when: datetime.datetime) -> None:
+        pass
+
+
+class SimulatedClock:
+    simulated = True
+
+    def __init__(self, date: datetime.date | None = None) -> None:
+        '''
+        Clock that only moves when advanced to the time of the next order event, so replays are reproducible
+        @param date: trading day the event times of day fall on, defaults to the date the events carry
+        '''
+        self.date = date
+        self.current: datetime.datetime | None = None
+        self.seconds: float | None = None # current as a timestamp, read on every fill
+
+    def advance(self, when: datetime.datetime) -> None:
+        '''
+        Move to an event time, never backwards
+        '''
+        if self.date is not None:
+            when = datetime.datetime.combine(self.date, when.time())
+        if self.current is None or when > self.current:
+            self.current = when
+            self.seconds = when.timestamp()
+
+    def now(self) -> datetime.datetime:
+        if self.current is None:
+            raise RuntimeError("simulated clock read before the first event")
+        return self.current
+
+    def time(self) -> float:
+        if self.seconds is None:
+            raise RuntimeError("simulated clock read before the first event")
+        return self.seconds
+
+
+WALL_CLOCK = WallClock()
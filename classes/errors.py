@@ -1,11 +1,45 @@
-class InstrumentNotFound(Exception):
-    pass
+class Rejection(Exception):
+    '''
+    Base of the order rejection reasons, each subclass has a fixed code and report message.
+    Checks on the order entry path return the class instead of raising it
+    '''
+    code = 0
+    message = "REJECTED"
 
-class MismatchCurrency(Exception):
-    pass
+    def __init__(self, message: str | None = None) -> None:
+        super().__init__(message or self.message)
 
-class InvalidSize(Exception):
-    pass
+class InstrumentNotFound(Rejection):
+    code = 1
+    message = "REJECTED - INSTRUMENT NOT FOUND"
 
-class PositionCheck(Exception):
-    pass
\ No newline at end of file
+class MismatchCurrency(Rejection):
+    code = 2
+    message = "REJECTED - MISMATCH CURRENCY"
+
+class InvalidSize(Rejection):
+    code = 3
+    message = "REJECTED - INVALID LOT SIZE"
+
+class PositionCheck(Rejection):
+    code = 4
+    message = "REJECTED - POSITION CHECK FAILED"
+
+class OrderNotFound(Rejection):
+    code = 5
+    message = "REJECTED - ORDER NOT FOUND"
+
+class NotionalLimit(Rejection):
+    code = 6
+    message = "REJECTED - NOTIONAL LIMIT EXCEEDED"
+
+class RateLimit(Rejection):
+    code = 7
+    message = "REJECTED - ORDER RATE LIMIT"
+
+class DuplicateOrderId(Rejection):
+    code = 8
+    message = "REJECTED - DUPLICATE ORDER ID"
+
+# code -> reason
+REASONS = (Rejection, InstrumentNotFound, MismatchCurrency, InvalidSize, PositionCheck, OrderNotFound, NotionalLimit, RateLimit, DuplicateOrderId)
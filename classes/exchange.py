@@ -0,0 +1,81 @@
+import os
+
+from typing import Dict, Iterable, List, Tuple
+
+from .client import Client
+from .instrument import Instrument, generate_bar_report
+from .order import Order, OrderBook
+from .ingest import dispatch, dispatch_batches
+from .refdata import CLIENTS_PATH, INSTRUMENTS_PATH, load_clients, load_instruments
+from .report import ReportEngine
+from .trades import TradeStore
+
+
+class Exchange:
+
+    def __init__(self, instruments: Dict[str, Instrument], clients: Dict[str, Client], reports: ReportEngine | None = None, columnar_trades: bool = False, **book_options) -> None:
+        '''
+        One simulated market, its instruments, clients, order books and reports
+
+        Nothing is shared between exchanges, so several can run side by side in one process, in
+        threads or one after another. The instruments dict is the registry the books check
+        orders against, InstrumentNotFound for an instrument not listed here.
+        @param instruments: InstrumentID -> Instrument, owned by this exchange from now on
+        @param clients: ClientID -> Client, owned by this exchange from now on
+        @param reports: where the end of day reports go, csv files in reports/ by default
+        @param columnar_trades: keep each book's fills in a columnar TradeStore
+        @param book_options: OrderBook keyword arguments shared by every book, e.g. auctions, metrics, clock
+        '''
+        self.instruments = instruments
+        self.clients = clients
+        self.reports = reports if reports is not None else ReportEngine()
+        self.orderbooks: Dict[str, OrderBook] = {
+            iid: OrderBook(iid, trade_store=TradeStore() if columnar_trades else None, ticks=instrument.ticks, registry=self.instruments, **book_options)
+            for iid, instrument in instruments.items()
+        }
+        self.last: OrderBook | None = None # book of the last order event
+
+    @classmethod
+    def load(cls, clients_path: str = CLIENTS_PATH, instruments_path: str = INSTRUMENTS_PATH, bar_interval: int | None = None, **kwargs) -> 'Exchange':
+        '''
+        Exchange of fresh Clients and Instruments read from the reference data files
+        @param bar_interval: optional OHLCV bar size in seconds
+        @param kwargs: as for Exchange
+        '''
+        return cls(load_instruments(instruments_path, bar_interval), load_clients(clients_path), **kwargs)
+
+    def run(self, orders: Iterable[Tuple[str, Order]], batch_size: int = 0) -> OrderBook | None:
+        '''
+        Feed (action, order) pairs to the books, returns the last book used
+        @param batch_size: hand new orders over in batches of this many, 0 processes them one at a time
+        '''
+        last = dispatch_batches(orders, self.orderbooks, batch_size) if batch_size else dispatch(orders, self.orderbooks)
+        if last is not None:
+            self.last = last
+        return last
+
+    def close(self) -> None:
+        '''
+        End of the day, uncross books still in their call phase and flush the trade logs
+        '''
+        for book in self.orderbooks.values():
+            if book.in_call:
+                book.uncross()
+            book.log.flush()
+
+    def write_reports(self, trade_summary: bool = False, bars: bool = False) -> List[str]:
+        '''
+        Write the end of day reports, returns the paths written
+        @param trade_summary: also write bought/sold volume and notional per instrument and client
+        @param bars: also write the OHLCV bars as CSV
+        '''
+        paths = self.reports.client_report(self.clients.values())
+        paths += self.reports.instrument_report(self.instruments.values())
+        paths += self.reports.exchange_report(self.orderbooks.values())
+        if trade_summary:
+            paths += self.reports.trade_summary(self.orderbooks.values())
+        if bars:
+            path = os.path.join(self.reports.directory, 'output_bar_report.csv')
+            generate_bar_report(self.instruments.values(), path)
+            paths.append(path)
+        return paths
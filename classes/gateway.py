@@ -0,0 +1,227 @@
+import asyncio
+import datetime
+import logging
+import signal
+
+from typing import Dict, List, Tuple
+
+from .client import Client
+from .errors import REASONS, DuplicateOrderId, OrderNotFound
+from .instrument import Instrument
+from .order import Order, OrderBook
+from .ingest import parse_rows
+
+
+# Request line, the order file columns with the action first:
+#   Action,Time,OrderID,Instrument,Quantity,Client,Price,Side
+# an empty Time is stamped with the gateway's clock. Reports sent back, one per line:
+#   ACK,OrderID
+#   REJECT,OrderID,Reason
+#   FILL,OrderID,Price,Size
+FIELDS = ('Action', 'Time', 'OrderID', 'Instrument', 'Quantity', 'Client', 'Price', 'Side')
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 512
+READ_SIZE = 1 << 16
+
+
+class Session:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+        One connected order entry session
+        '''
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info('peername')
+
+    def send(self, line: str) -> None:
+        # Buffered by the transport, the session's reader waits on drain() so a slow reader only stalls itself
+        if not self.writer.is_closing():
+            self.writer.write(line.encode())
+
+
+class Gateway:
+
+    def __init__(self, clients: Dict[str, Client], instruments: Dict[str, Instrument], orderbooks: Dict[str, OrderBook], queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        '''
+        asyncio TCP order entry in front of the OrderBooks
+
+        Every instrument has a bounded queue drained by its own task, so a full queue stops the
+        sessions feeding it from reading their sockets and TCP pushes back on the senders.
+        @param queue_size: orders queued per instrument before sessions wait
+        @param batch_size: orders an instrument task takes off its queue at a time
+        '''
+        self.clients = clients
+        self.instruments = instruments
+        self.orderbooks = orderbooks
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.tasks: List[asyncio.Task] = []
+        self.server: asyncio.Server | None = None
+        self.last: OrderBook | None = None
+
+        # order id -> (session, book) of a live order, for reporting fills and checking cancels and amends
+        self.owners: Dict[str, Tuple[Session, OrderBook]] = {}
+        self.fills: List[Tuple[str, float, float]] = []
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        for iid, ob in self.orderbooks.items():
+            self.queues[iid] = asyncio.Queue(self.queue_size)
+            self.tasks.append(asyncio.create_task(self.run_instrument(iid)))
+            previous = ob.callback
+            ob.callback = self.chain(previous) if previous is not None else self.fill
+
+        self.server = await asyncio.start_server(self.handle, host, port)
+        logging.info(f"Gateway listening on {', '.join(str(s.getsockname()) for s in self.server.sockets)}")
+        return self.server
+
+    async def stop(self) -> None:
+        '''
+        Stop accepting sessions, process what is queued and stop the instrument tasks
+        '''
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for queue in self.queues.values():
+            await queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def chain(self, previous):
+        def callback(book, buy, sell, price, size, time):
+            previous(book, buy, sell, price, size, time)
+            self.fill(book, buy, sell, price, size, time)
+        return callback
+
+    def fill(self, book: OrderBook, buy: Order, sell: Order, price: int, size: float, time) -> None:
+        price = book.ticks.to_price(price)
+        self.fills.append((buy.id, price, size))
+        self.fills.append((sell.id, price, size))
+
+    def parse(self, line: str) -> Tuple[str, Order] | None:
+        row = dict(zip(FIELDS, line.rstrip('\r\n').split(',')))
+        if not row.get('Time'):
+            now = datetime.datetime.now()
+            row['Time'] = f"{now.hour}:{now.minute:02d}:{now.second:02d}"
+        return next(parse_rows((row,), self.clients, self.instruments), None)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = Session(reader, writer)
+        logging.info(f"Session {session.peer} connected")
+        partial = b''
+        try:
+            while True:
+                chunk = await reader.read(READ_SIZE)
+                if not chunk:
+                    break
+
+                # A whole read is handled in one go, only the trailing partial line waits for more
+                *lines, partial = (partial + chunk).split(b'\n')
+                for raw in lines:
+                    if not raw.strip():
+                        continue
+                    try:
+                        line = raw.decode()
+                        parsed = self.parse(line)
+                    except UnicodeDecodeError:
+                        line, parsed = raw.decode(errors='replace'), None
+                    if parsed is None:
+                        fields = line.split(',')
+                        session.send(f"REJECT,{fields[2] if len(fields) > 2 else ''},REJECTED - MALFORMED ORDER\n")
+                        continue
+                    action, order = parsed
+                    await self.queues[order.instrument.instrumentID].put((session, action, order))
+
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            logging.info(f"Session {session.peer} disconnected")
+            writer.close()
+
+    async def run_instrument(self, iid: str) -> None:
+        queue = self.queues[iid]
+        ob = self.orderbooks[iid]
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            for session, action, order in batch:
+                self.execute(ob, session, action, order)
+            self.last = ob
+
+            for _ in batch:
+                queue.task_done()
+
+    def execute(self, ob: OrderBook, session: Session, action: str, order: Order) -> None:
+        '''
+        Apply one order event and report the outcome, then the fills it caused, to their sessions
+
+        Sessions can only cancel or amend their own live orders in that book, and a new order
+        cannot take the id of a live order of any session.
+        '''
+        rejected = len(ob.rejections)
+        failed = len(ob.errors)
+
+        owner = self.owners.get(order.id)
+        owned = True
+        if action == 'New':
+            if owner is not None:
+                ob.reject(order.id, DuplicateOrderId, order.time)
+                owned = False
+            else:
+                self.owners[order.id] = (session, ob)
+                ob.process_order(order, order.rating)
+        elif owner is None or owner[0] is not session or owner[1] is not ob:
+            ob.reject(order.id, OrderNotFound, order.time)
+            owned = False
+        elif action == 'Cancel':
+            ob.cancel_order(order.id, order.time)
+        else:
+            ob.amend_order(order.id, order.quantity, order.price, order.time)
+
+        if len(ob.rejections) > rejected:
+            session.send(f"REJECT,{order.id},{REASONS[ob.rejections.codes[-1]].message}\n")
+        elif len(ob.errors) > failed:
+            session.send(f"REJECT,{order.id},{ob.errors[-1].split('|')[-1]}\n")
+        else:
+            session.send(f"ACK,{order.id}\n")
+
+        for order_id, price, size in self.fills:
+            owner = self.owners.get(order_id)
+            if owner is not None:
+                owner[0].send(f"FILL,{order_id},{price},{size}\n")
+
+        # Orders done with, filled, cancelled or rejected, no longer report back
+        for order_id, _, _ in self.fills:
+            if order_id not in ob.resting:
+                self.owners.pop(order_id, None)
+        self.fills.clear()
+        if owned and order.id not in ob.resting:
+            self.owners.pop(order.id, None)
+
+
+async def serve(host: str, port: int, clients: Dict[str, Client], instruments: Dict[str, Instrument], orderbooks: Dict[str, OrderBook], stop: asyncio.Event | None = None, **kwargs) -> OrderBook | None:
+    '''
+    Run a Gateway until stop is set, returns the last book used
+    @param stop: event ending the session, the gateway then drains its queues. Defaults to SIGINT/SIGTERM
+    '''
+    if stop is None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+    gateway = Gateway(clients, instruments, orderbooks, **kwargs)
+    await gateway.start(host, port)
+    try:
+        await stop.wait()
+    finally:
+        await gateway.stop()
+    return gateway.last
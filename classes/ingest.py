@@ -0,0 +1,132 @@
+import csv
+import logging
+import sys
+
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .clock import parse_time
+from .order import Order, OrderBook
+
+
+DEFAULT_BUFFER_SIZE = 1 << 20 # 1 MiB
+DEFAULT_BATCH_SIZE = 1000 # new orders per process_orders batch
+
+ACTIONS = ('New', 'Cancel', 'Amend')
+
+
+def open_orders(path: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+    '''
+    Open an order file for streaming, '-' reads from stdin
+    @param path: file path or '-'
+    @param buffer_size: read buffer size in bytes
+    '''
+    if path == '-':
+        return open(sys.stdin.fileno(), newline='', buffering=buffer_size, closefd=False)
+    return open(path, newline='', buffering=buffer_size)
+
+
+def read_orders(lines: Iterable[str], clients: Dict, instruments: Dict) -> Iterator[Tuple[str, Order]]:
+    '''
+    Parse and validate order rows one at a time, yields (action, order) pairs
+    @param lines: iterable of CSV lines, header first
+    @param clients: ClientID -> Client
+    @param instruments: InstrumentID -> Instrument
+    '''
+    return parse_rows(csv.DictReader(lines), clients, instruments)
+
+
+def parse_rows(rows: Iterable[Dict[str, str]], clients: Dict, instruments: Dict) -> Iterator[Tuple[str, Order]]:
+    '''
+    Turn order rows keyed by the order file header into (action, order) pairs
+
+    Rows referring to unknown clients/instruments or holding malformed fields are logged and skipped
+    '''
+    for line in rows:
+        try:
+            # Optional column, plain order files only carry new orders
+            action = line.get('Action') or 'New'
+            if action not in ACTIONS:
+                raise ValueError(f"unknown action {action}")
+
+            instrument = instruments.get(line['Instrument'])
+            if instrument is None:
+                raise ValueError(f"unknown instrument {line['Instrument']}")
+
+            client = clients.get(line['Client'])
+            if client is None and action == 'New':
+                raise ValueError(f"unknown client {line['Client']}")
+
+            new_order = Order(
+                id=line['OrderID'],
+                time=parse_time(line['Time']),
+                client=client,
+                instrument=instrument,
+                side=line["Side"] == "Buy",
+                price=line["Price"] or "Market",
+                quantity=float(line["Quantity"] or 0),
+                rating=client.rating if client else None
+            )
+
+        except (KeyError, ValueError) as e:
+            logging.error(f"Skipping order row {line.get('OrderID')}: {e}")
+            continue
+
+        yield action, new_order
+
+
+def dispatch(orders: Iterable[Tuple[str, Order]], orderbooks: Dict[str, OrderBook]) -> OrderBook | None:
+    '''
+    Feed (action, order) pairs to the OrderBook of their instrument, returns the last book used
+    '''
+    ob = None
+    for action, order in orders:
+        ob = orderbooks[order.instrument.instrumentID]
+
+        if action == 'Cancel':
+            ob.cancel_order(order.id, order.time)
+        elif action == 'Amend':
+            ob.amend_order(order.id, order.quantity, order.price, order.time)
+        else:
+            ob.process_order(order, order.rating)
+
+    return ob
+
+
+def dispatch_batches(orders: Iterable[Tuple[str, Order]], orderbooks: Dict[str, OrderBook], batch_size: int = DEFAULT_BATCH_SIZE) -> OrderBook | None:
+    '''
+    dispatch, with runs of new orders processed in batches, returns the last book used
+
+    The static checks run as the orders arrive, in arrival order over every book, then each book
+    takes its share of the batch in one OrderBook.process_orders call. Books, instruments, client
+    positions and the reports end up as with dispatch. Cancels and amends process the pending
+    batch first.
+    @param batch_size: most new orders held before they are processed
+    '''
+    ob = None
+    # instrument -> (book, orders, prechecks) of the pending batch
+    batches: Dict[str, Tuple[OrderBook, List[Order], list]] = {}
+    pending = 0
+    for action, order in orders:
+        ob = orderbooks[order.instrument.instrumentID]
+
+        if action == 'New':
+            _, batch, prechecks = batches.setdefault(order.instrument.instrumentID, (ob, [], []))
+            batch.append(order)
+            prechecks.append(order.client.checkStatic(order, ob.registry))
+            pending += 1
+            if pending < batch_size:
+                continue
+
+        for book, batch, prechecks in batches.values():
+            book.process_orders(batch, prechecks)
+        batches.clear()
+        pending = 0
+
+        if action == 'Cancel':
+            ob.cancel_order(order.id, order.time)
+        elif action == 'Amend':
+            ob.amend_order(order.id, order.quantity, order.price, order.time)
+
+    for book, batch, prechecks in batches.values():
+        book.process_orders(batch, prechecks)
+    return ob
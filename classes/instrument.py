@@ -1,52 +1,148 @@
 import csv, os
+import datetime
 
-class Instrument:
+from collections import deque
+
+from .clock import seconds_of_day
+from .report import INSTRUMENT_HEADER, instrument_columns, write_table
+
+
+# Fine enough for any decimal price in the order files, instruments can declare a coarser one
+DEFAULT_TICK_SIZE = 0.0001
+
+
+class TickScale:
+
+    def __init__(self, tickSize: float = DEFAULT_TICK_SIZE) -> None:
+        '''
+        Converts decimal prices to integer ticks and back
+        @param tickSize: minimum price increment
+        '''
+        if tickSize <= 0:
+            raise ValueError(f"tick size must be positive, got {tickSize}")
+        self.tickSize = tickSize
+
+        # Ticks per unit when the tick divides 1 (0.01, 0.05, 0.0001...), dividing by it
+        # gives back exactly the float the decimal price parses to
+        per_unit = 1 / tickSize
+        self.scale: int | None = round(per_unit) if abs(per_unit - round(per_unit)) < 1e-9 else None
+
+    def to_ticks(self, price: float) -> int:
+        '''
+        Price in ticks, raises ValueError if price is not a multiple of the tick size
+        '''
+        exact = price * self.scale if self.scale else price / self.tickSize
+        ticks = round(exact)
+        if abs(exact - ticks) > 1e-6:
+            raise ValueError(f"price {price} is not a multiple of the tick size {self.tickSize}")
+        return ticks
+
+    def to_price(self, ticks: float | None) -> float | None:
+        if ticks is None:
+            return None
+        return ticks / self.scale if self.scale else round(ticks * self.tickSize, 10)
+
+
+class Bar:
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume')
 
-    INSTRUMENTS = set()
+    def __init__(self, start: int, price: float, volume: float) -> None:
+        '''
+        OHLCV bar of one time bucket, prices in ticks
+        @param start: bucket start, seconds since midnight
+        '''
+        self.start = start
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.volume = volume
 
-    def __init__(self, instrumentID: str, currency: str, lotSize: int) -> None:
+    def add(self, price: float, volume: float) -> None:
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+
+    def __str__(self) -> str:
+        return f"{datetime.timedelta(seconds=self.start)} O {self.open} H {self.high} L {self.low} C {self.close} V {self.volume}"
+
+
+class Instrument:
+
+    def __init__(self, instrumentID: str, currency: str, lotSize: int, tickSize: float = DEFAULT_TICK_SIZE, bar_interval: int | None = None, max_bars: int = 1440) -> None:
+        '''
+        Class representing a single instrument and its running trade statistics, prices in integer ticks
+        @param tickSize: minimum price increment, order prices must be a multiple of it
+        @param bar_interval: optional OHLCV bar size in seconds, e.g. 1 or 60
+        @param max_bars: number of most recent bars kept
+        '''
         self.instrumentID = instrumentID
         self.currency = currency
         self.lotSize = lotSize
-        self.open_price : float = None
-        self.closed_price : float = None
+        self.ticks = TickScale(tickSize)
+        self.open_price : int = None
+        self.closed_price : int = None
+        self.last_price : int = None
         self.total_traded_volume : int = 0
-        self.day_high : float = None
-        self.day_low : float = None
-        self.matchings : list = []
-        Instrument.INSTRUMENTS.add(instrumentID)
+        self.total_notional : float = 0.0 # in ticks, exact for integer volumes
+        self.day_high : int = None
+        self.day_low : int = None
+        self.bar_interval = bar_interval
+        self.bars : deque[Bar] = deque(maxlen=max_bars)
 
-    def add_matching(self, price, volume):
-        self.matchings.append((price, volume))
+    def add_matching(self, price, volume, time: datetime.datetime | None = None):
         self.total_traded_volume += volume
+        self.total_notional += price * volume
+        self.last_price = price
         if self.open_price is None:
             self.open_price = price
         self.day_high = max(self.day_high, price) if self.day_high is not None else price
         self.day_low = min(self.day_low, price) if self.day_low is not None else price
-    
-def generate_instrument_report(instruments: list[Instrument]):
+
+        if self.bar_interval and time is not None:
+            seconds = seconds_of_day(time)
+            start = seconds - seconds % self.bar_interval
+            if self.bars and self.bars[-1].start == start:
+                self.bars[-1].add(price, volume)
+            else:
+                self.bars.append(Bar(start, price, volume))
+
+    @property
+    def vwap(self) -> float:
+        return round(self.ticks.to_price(self.total_notional / self.total_traded_volume), 4) if self.total_traded_volume != 0 else 0
+
+    def generateReportRow(self) -> dict:
+        """
+        Current statistics as a row of the instrument report, can be called at any time of the day
+        """
+        to_price = self.ticks.to_price
+        return {
+            'Instrument ID': self.instrumentID,
+            'OpenPrice': to_price(self.open_price),
+            'ClosePrice': to_price(self.closed_price),
+            'TotalVolume': self.total_traded_volume,
+            'VWAP': self.vwap,
+            'DayHigh': to_price(self.day_high),
+            'DayLow': to_price(self.day_low)
+        }
+
+def generate_instrument_report(instruments: list[Instrument], path: str = os.path.join('reports', 'output_instrument_report.csv')):
     """
     Generate instrument report
     """
-    instrumentRows = []
-
-    for instrument in instruments:
-        total_price_volume = sum([price * volume for price, volume in instrument.matchings])
-        vwap = round(total_price_volume / instrument.total_traded_volume, 4) if instrument.total_traded_volume != 0 else 0
-
-        instrumentRows.append({
-            'Instrument ID': instrument.instrumentID,
-            'OpenPrice': instrument.open_price,
-            'ClosePrice': instrument.closed_price,
-            'TotalVolume': instrument.total_traded_volume,
-            'VWAP': vwap,
-            'DayHigh': instrument.day_high,
-            'DayLow': instrument.day_low
-        })
-    outputInstrumentPath = os.path.join('reports', 'output_instrument_report.csv')
-
-    with open(outputInstrumentPath, 'w', newline='') as csvfile:
-        fields = ['Instrument ID', 'OpenPrice', 'ClosePrice', 'TotalVolume', 'VWAP', 'DayHigh', 'DayLow']
-        writer = csv.DictWriter(csvfile, fieldnames=fields)
-        writer.writeheader()
-        writer.writerows(instrumentRows)
+    write_table(path, INSTRUMENT_HEADER, instrument_columns(instruments))
+
+def generate_bar_report(instruments: list[Instrument], path: str = os.path.join('reports', 'output_bar_report.csv')):
+    """
+    Generate OHLCV bar report from the bars each instrument currently holds
+    """
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Instrument ID', 'Time', 'Open', 'High', 'Low', 'Close', 'Volume'])
+        for instrument in instruments:
+            to_price = instrument.ticks.to_price
+            for bar in instrument.bars:
+                writer.writerow([instrument.instrumentID, datetime.timedelta(seconds=bar.start), to_price(bar.open), to_price(bar.high), to_price(bar.low), to_price(bar.close), bar.volume])
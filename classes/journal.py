@@ -0,0 +1,421 @@
+import datetime
+import logging
+import math
+import os
+import pickle
+import struct
+import zlib
+
+from typing import Dict, Iterable, Iterator, Tuple
+
+from .client import Client
+from .clock import SimulatedClock, seconds_of_day, time_of_day
+from .instrument import Instrument
+from .order import Order, OrderBook, Trade
+from .ingest import dispatch
+
+
+DEFAULT_FSYNC_EVERY = 1000
+DEFAULT_SNAPSHOT_EVERY = 100000
+
+# Record kinds
+NEW, CANCEL, AMEND, FILL = range(4)
+KINDS = {'New': NEW, 'Cancel': CANCEL, 'Amend': AMEND}
+ACTIONS = {kind: action for action, kind in KINDS.items()}
+
+# kind, payload length, crc32 of the payload
+FRAME = struct.Struct('<BHI')
+# sequence number, seconds since midnight (-1 if unknown)
+HEAD = struct.Struct('<Qi')
+# numeric fields per kind, followed by length prefixed utf-8 strings
+BODY = {
+    NEW : struct.Struct('<?dd'), # side, price (nan = market), quantity
+    CANCEL : struct.Struct('<'),
+    AMEND : struct.Struct('<dd'), # quantity, price (nan = unchanged)
+    FILL : struct.Struct('<dd'), # price, size
+}
+STRING = struct.Struct('<H')
+
+
+def _seconds(time: datetime.datetime | None) -> int:
+    return seconds_of_day(time) if time is not None else -1
+
+
+def _time(seconds: int) -> datetime.datetime | None:
+    return time_of_day(seconds) if seconds >= 0 else None
+
+
+def encode(kind: int, seq: int, time: datetime.datetime | None, numbers: tuple, strings: tuple) -> bytes:
+    payload = [HEAD.pack(seq, _seconds(time)), BODY[kind].pack(*numbers)]
+    for value in strings:
+        raw = str(value).encode()
+        payload.append(STRING.pack(len(raw)))
+        payload.append(raw)
+    payload = b''.join(payload)
+    return FRAME.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+
+def decode(kind: int, payload: bytes) -> Tuple[int, datetime.datetime | None, tuple, list]:
+    seq, seconds = HEAD.unpack_from(payload)
+    body = BODY[kind]
+    numbers = body.unpack_from(payload, HEAD.size)
+    offset = HEAD.size + body.size
+    strings = []
+    while offset < len(payload):
+        size, = STRING.unpack_from(payload, offset)
+        offset += STRING.size
+        strings.append(payload[offset:offset + size].decode())
+        offset += size
+    return seq, _time(seconds), numbers, strings
+
+
+def read_journal(path: str) -> Tuple[list, int]:
+    '''
+    Read every intact record of a journal, returns ([(kind, seq, time, numbers, strings)], end offset)
+
+    Reading stops at the first torn or corrupt record, the end offset is where the valid part ends
+    '''
+    records = []
+    end = 0
+    if not os.path.exists(path):
+        return records, end
+
+    with open(path, 'rb') as journal:
+        data = journal.read()
+
+    while end + FRAME.size <= len(data):
+        kind, size, crc = FRAME.unpack_from(data, end)
+        payload = data[end + FRAME.size:end + FRAME.size + size]
+        if kind not in BODY or len(payload) != size or zlib.crc32(payload) != crc:
+            logging.warning(f"Journal {path} ends in a torn record at byte {end}, ignoring the rest")
+            break
+        records.append((kind, *decode(kind, payload)))
+        end += FRAME.size + size
+
+    return records, end
+
+
+class Journal:
+
+    def __init__(self, path: str, seq: int = 0, events: int = 0, fsync_every: int = DEFAULT_FSYNC_EVERY) -> None:
+        '''
+        Append-only binary write-ahead journal of order events and fills
+        @param seq: sequence number of the last record already written
+        @param events: order events (new, cancel, amend) already applied
+        @param fsync_every: records buffered before a write and fsync, the most that a crash can lose
+        '''
+        self.path = path
+        self.seq = seq
+        self.events = events
+        self.fsync_every = fsync_every
+        self.buffer = []
+        self.file = open(path, 'ab')
+
+    def write(self, kind: int, time: datetime.datetime | None, numbers: tuple, strings: tuple) -> None:
+        self.seq += 1
+        self.buffer.append(encode(kind, self.seq, time, numbers, strings))
+        if len(self.buffer) >= self.fsync_every:
+            self.flush()
+
+    def record(self, action: str, order: Order) -> None:
+        '''
+        Journal one order event ahead of processing it
+        '''
+        kind = KINDS[action]
+        instrument = order.instrument.instrumentID
+        # decimal prices, replay converts them back to ticks like the order file
+        price = order.instrument.ticks.to_price(order.price) if order.price is not None else math.nan
+        if kind == NEW:
+            self.write(NEW, order.time, (order.side, price, order.quantity), (order.id, order.client.ID, instrument))
+        elif kind == CANCEL:
+            self.write(CANCEL, order.time, (), (order.id, instrument))
+        else:
+            self.write(AMEND, order.time, (order.quantity, price), (order.id, instrument))
+        self.events += 1
+
+    def fill(self, book: OrderBook, buy: Order, sell: Order, price: int, size: float, time: datetime.datetime | None) -> None:
+        '''
+        OrderBook fill callback, fills are kept for audit and skipped on replay
+        '''
+        self.write(FILL, time, (book.ticks.to_price(price), size), (buy.instrument.instrumentID, buy.id, sell.id))
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.file.write(b''.join(self.buffer))
+            self.buffer = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def reset(self) -> None:
+        '''
+        Drop every record, once a snapshot covers them
+        '''
+        self.flush()
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def tee(self, orders: Iterable[Tuple[str, Order]], snapshots: 'Snapshotter | None' = None) -> Iterator[Tuple[str, Order]]:
+        '''
+        Journal (action, order) pairs on their way to dispatch, taking a snapshot whenever one is due
+
+        A pair is journaled before it is handed on, and the snapshot check runs once the
+        previous pair has been fully processed, so snapshots always fall between events.
+        '''
+        for action, order in orders:
+            if snapshots is not None and snapshots.due(self.events):
+                snapshots.take(self)
+            self.record(action, order)
+            yield action, order
+
+
+# Client attributes a snapshot restores, the rest comes from the client file
+CLIENT_STATE = ('positions', 'netPositions', 'openSells', 'rateSecond', 'rateCount')
+
+
+def history_path(snapshot_path: str) -> str:
+    '''
+    Companion file of a snapshot, the append-only fills, rejections and errors of the books
+    '''
+    return snapshot_path + '.history'
+
+
+def clear_snapshot(snapshot_path: str) -> None:
+    '''
+    Remove a snapshot and its history, before a fresh run
+    '''
+    for path in (snapshot_path, history_path(snapshot_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _book_state(ob: OrderBook) -> dict:
+    '''
+    What a book needs to carry on, its resting orders in queue order and session state, but not its history
+    '''
+    levels = [ob.market_bids, ob.market_offers, *ob.bid_ladder.levels.values(), *ob.offer_ladder.levels.values()]
+    resting = [
+        (rating, order.id, order.time, order.client.ID, order.side, order.price, order.quantity, order.rating)
+        for level in levels for rating, order in level.queue()
+    ]
+    return {
+        'order_id' : ob.order_id,
+        'in_call' : ob.in_call,
+        'closed' : ob.closed,
+        'last_price' : ob.last_price,
+        'pre_orders' : ob.pre_orders,
+        'post_orders' : ob.post_orders,
+        'auction_index' : ob.auction_index,
+        'resting' : resting,
+        'logged' : ob.log.count,
+    }
+
+
+def _restore_book(ob: OrderBook, state: dict, clients: Dict[str, Client], instrument: Instrument) -> None:
+    ob.order_id = state['order_id']
+    ob.in_call = state['in_call']
+    ob.closed = state['closed']
+    ob.last_price = state['last_price']
+    ob.pre_orders = state['pre_orders']
+    ob.post_orders = state['post_orders']
+    ob.auction_index = state['auction_index']
+    ob.log.count = state['logged']
+
+    for rating, order_id, time, client_id, side, price, quantity, order_rating in state['resting']:
+        order = Order(order_id, time, clients[client_id], instrument, side, "Market", quantity, order_rating)
+        order.price = price # already in ticks
+        if price is None:
+            level = ob.market_bids if side else ob.market_offers
+        else:
+            level = (ob.bid_ladder if side else ob.offer_ladder).level(price)
+        level.push(rating, order)
+        ob.resting[order_id] = order
+
+
+def _history(ob: OrderBook, marks: Tuple[int, int, int]) -> tuple:
+    '''
+    Fills, rejections and errors of a book since marks, the (trades, rejections, errors) counts already written
+    '''
+    trades, rejections, errors = marks
+    fills = [
+        (trade.buyer.ID, trade.seller.ID, trade.price, trade.volume, trade.time)
+        for trade in (ob.trades[idx] for idx in range(trades, len(ob.trades)))
+    ]
+    rejects = (ob.rejections.ids[rejections:], ob.rejections.codes[rejections:].tolist(), ob.rejections.times[rejections:].tolist())
+    return fills, rejects, ob.errors[errors:]
+
+
+def _counts(ob: OrderBook) -> Tuple[int, int, int]:
+    return len(ob.trades), len(ob.rejections), len(ob.errors)
+
+
+class Snapshotter:
+
+    def __init__(self, path: str, clients: Dict[str, Client], instruments: Dict[str, Instrument], orderbooks: Dict[str, OrderBook], every: int = DEFAULT_SNAPSHOT_EVERY) -> None:
+        '''
+        Periodic snapshots of the books, instrument statistics and client positions
+
+        A snapshot holds the state the books carry on from, resting orders, auction state, instrument
+        statistics and client positions, so its size follows the book rather than the session. Fills,
+        rejections and errors are appended to the history file next to it, each snapshot writing only
+        what happened since the previous one.
+        @param every: order events between snapshots, bounds how much journal a restart replays
+        '''
+        self.path = path
+        self.clients = clients
+        self.instruments = instruments
+        self.orderbooks = orderbooks
+        self.every = every
+        self.last = 0
+
+        # instrument -> (trades, rejections, errors) already in the history, and the history's valid size
+        header = read_snapshot_header(path)
+        self.marks: Dict[str, Tuple[int, int, int]] = header['marks'] if header else {}
+        self.history_size: int = header['history_size'] if header else 0
+
+    def due(self, events: int) -> bool:
+        return events - self.last >= self.every
+
+    def take(self, journal: Journal | None = None) -> None:
+        '''
+        Write a snapshot and, once it is safely on disk, truncate the journal it covers
+        '''
+        for ob in self.orderbooks.values():
+            ob.log.flush()
+
+        history = {iid: _history(ob, self.marks.get(iid, (0, 0, 0))) for iid, ob in self.orderbooks.items()}
+        with open(history_path(self.path), 'ab') as out:
+            # anything past the last snapshot's size was written by a snapshot that never completed
+            out.truncate(self.history_size)
+            pickle.dump(history, out, pickle.HIGHEST_PROTOCOL)
+            out.flush()
+            os.fsync(out.fileno())
+            history_size = out.tell()
+
+        marks = {iid: _counts(ob) for iid, ob in self.orderbooks.items()}
+        header = {
+            'seq' : journal.seq if journal else 0,
+            'events' : journal.events if journal else 0,
+            'marks' : marks,
+            'history_size' : history_size,
+        }
+        state = {
+            'clients' : {cid: {attr: getattr(client, attr) for attr in CLIENT_STATE} for cid, client in self.clients.items()},
+            'instruments' : {iid: vars(instrument) for iid, instrument in self.instruments.items()},
+            'books' : {iid: _book_state(ob) for iid, ob in self.orderbooks.items()},
+        }
+
+        partial = self.path + '.tmp'
+        with open(partial, 'wb') as out:
+            pickle.dump(header, out, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(state, out, pickle.HIGHEST_PROTOCOL)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(partial, self.path)
+        self.marks = marks
+        self.history_size = history_size
+
+        if journal is not None:
+            self.last = journal.events
+            journal.reset()
+
+
+def read_snapshot_header(path: str) -> dict | None:
+    '''
+    seq, events, history marks and history size of a snapshot, without loading the rest of it
+    '''
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as snapshot:
+        return pickle.load(snapshot)
+
+
+def restore_snapshot(path: str, clients: Dict[str, Client], instruments: Dict[str, Instrument], orderbooks: Dict[str, OrderBook]) -> dict | None:
+    '''
+    Load a snapshot and its history into freshly built clients, instruments and books, returns its header
+
+    The books keep their own sinks, clocks, metrics and registry, only their state is restored.
+    '''
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as snapshot:
+        header = pickle.load(snapshot)
+        state = pickle.load(snapshot)
+
+    for cid, attrs in state['clients'].items():
+        for attr, value in attrs.items():
+            setattr(clients[cid], attr, value)
+    for iid, attrs in state['instruments'].items():
+        vars(instruments[iid]).update(attrs)
+    for iid, book in state['books'].items():
+        _restore_book(orderbooks[iid], book, clients, instruments[iid])
+
+    with open(history_path(path), 'rb') as history:
+        while history.tell() < header['history_size']:
+            for iid, (fills, rejects, errors) in pickle.load(history).items():
+                ob = orderbooks[iid]
+                for buyer, seller, price, volume, time in fills:
+                    ob.trades.append(Trade(clients[buyer], clients[seller], price, volume, time))
+                ob.rejections.extend(*rejects)
+                ob.errors.extend(errors)
+
+    return header
+
+
+def replay_order(kind: int, time: datetime.datetime | None, numbers: tuple, strings: list, clients: Dict[str, Client], instruments: Dict[str, Instrument]) -> Tuple[str, Order]:
+    '''
+    Rebuild the (action, order) pair of a journaled order event, the same pair parse_rows produced
+    '''
+    if kind == NEW:
+        side, price, quantity = numbers
+        order_id, client_id, instrument_id = strings
+        client = clients[client_id]
+        return 'New', Order(order_id, time, client, instruments[instrument_id], side, "Market" if math.isnan(price) else price, quantity, client.rating)
+
+    order_id, instrument_id = strings
+    quantity, price = numbers if kind == AMEND else (0.0, math.nan)
+    return ACTIONS[kind], Order(order_id, time, None, instruments[instrument_id], False, "Market" if math.isnan(price) else price, quantity, None)
+
+
+def recover(snapshot_path: str, journal_path: str, clients: Dict[str, Client], instruments: Dict[str, Instrument], orderbooks: Dict[str, OrderBook], fsync_every: int = DEFAULT_FSYNC_EVERY, clock: SimulatedClock | None = None) -> Journal:
+    '''
+    Restore the last snapshot and replay the journal after it, returns the journal reopened for appending
+
+    clients, instruments and orderbooks are updated in place and every book's fill callback is pointed
+    at the returned journal. Its events count is the number of order events already applied, the
+    caller skips that many before feeding new ones.
+    @param clock: SimulatedClock of a replay, advanced to each replayed event so fills keep their event times
+    '''
+    records, end = read_journal(journal_path)
+    if os.path.exists(journal_path) and end < os.path.getsize(journal_path):
+        with open(journal_path, 'r+b') as torn:
+            torn.truncate(end)
+
+    journal = Journal(journal_path, fsync_every=fsync_every)
+
+    header = restore_snapshot(snapshot_path, clients, instruments, orderbooks)
+    if header is not None:
+        journal.seq, journal.events = header['seq'], header['events']
+
+    # Fills replayed here are already in the journal
+    for ob in orderbooks.values():
+        ob.callback = None
+
+    covered = journal.seq
+    for kind, seq, time, numbers, strings in records:
+        journal.seq = max(journal.seq, seq)
+        if kind == FILL or seq <= covered:
+            continue
+        if clock is not None and time is not None:
+            clock.advance(time)
+        dispatch((replay_order(kind, time, numbers, strings, clients, instruments),), orderbooks)
+        journal.events += 1
+
+    for ob in orderbooks.values():
+        ob.callback = journal.fill
+
+    logging.info(f"Recovered {journal.events} order events, journal at record {journal.seq}")
+    return journal
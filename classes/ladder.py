@@ -0,0 +1,446 @@
+import heapq
+from bisect import bisect_left
+from types import MappingProxyType
+
+
+class PriceLevel:
+
+    def __init__(self) -> None:
+        '''
+        Priority queue of the orders resting at a single price, best first by (rating, time)
+        '''
+        # [rating, time, seq, order], order is None once cancelled
+        self.heap: list = []
+
+        # order id -> heap entry, only live orders
+        self.handles: dict = {}
+
+        # Remaining quantity of the live orders, kept up to date by push/pop/cancel and reduce
+        self.total = 0
+
+        self.seq = 0
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    def __bool__(self) -> bool:
+        return bool(self.handles)
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self.handles
+
+    def __iter__(self):
+        """
+        Live (rating, order) pairs, in no particular order
+        """
+        for entry in self.heap:
+            if entry[3] is not None:
+                yield entry[0], entry[3]
+
+    def queue(self) -> list:
+        """
+        Live (rating, order) pairs in the order they were pushed, pushing them in turn rebuilds the same queue
+        """
+        return [(entry[0], entry[3]) for entry in sorted(self.handles.values(), key=lambda entry: entry[2])]
+
+    def push(self, rating: int, order) -> None:
+        self.seq += 1
+        entry = [rating, order.time, self.seq, order]
+        self.handles[order.id] = entry
+        heapq.heappush(self.heap, entry)
+        self.total += order.quantity
+
+    def extend(self, pairs: list) -> None:
+        """
+        push for each (rating, order) pair in turn, heapifying once when they outnumber the queue
+        """
+        heap = self.heap
+        bulk = len(pairs) > len(heap)
+        for rating, order in pairs:
+            self.seq += 1
+            entry = [rating, order.time, self.seq, order]
+            self.handles[order.id] = entry
+            if bulk:
+                heap.append(entry)
+            else:
+                heapq.heappush(heap, entry)
+            self.total += order.quantity
+        if bulk:
+            heapq.heapify(heap)
+
+    def head(self) -> tuple:
+        """
+        Returns the (rating, order) pair with the highest priority
+        """
+        heap = self.heap
+        while heap[0][3] is None: # drop cancelled entries lazily
+            heapq.heappop(heap)
+        return heap[0][0], heap[0][3]
+
+    def pop(self) -> tuple:
+        """
+        Removes and returns the (rating, order) pair with the highest priority
+        """
+        rating, order = self.head()
+        heapq.heappop(self.heap)
+        del self.handles[order.id]
+        if order.quantity > 0: # partially filled orders leave with what is left
+            self.total -= order.quantity
+        return rating, order
+
+    def reduce(self, qty) -> None:
+        """
+        Account for qty filled from, or amended off, an order resting here
+        """
+        self.total -= qty
+
+    def cancel(self, order_id: str):
+        """
+        Removes an order from the queue in O(1), returns the order
+        """
+        entry = self.handles.pop(order_id)
+        order = entry[3]
+        entry[3] = None
+        self.total -= order.quantity
+
+        if not self.handles:
+            self.heap.clear()
+            self.total = 0
+        elif len(self.heap) > 2 * len(self.handles):
+            # more cancelled entries than live ones, rebuild rather than wait for them to reach the head
+            self.heap = [entry for entry in self.heap if entry[3] is not None]
+            heapq.heapify(self.heap)
+        return order
+
+
+class PriceLadder:
+
+    def __init__(self, descending: bool, factory = PriceLevel) -> None:
+        '''
+        Sorted index of the price levels on one side of an OrderBook
+        @param descending: boolean, TRUE=best price is the highest (bids), FALSE=best price is the lowest (offers)
+        @param factory: callable creating an empty price level
+        '''
+        self.descending = descending
+        self.factory = factory
+
+        # price -> level
+        self.levels: dict = {}
+
+        # Sort keys kept ascending with the best price last, so the touch is
+        # always read and removed at the end of the list in O(1)
+        self.keys: list = []
+
+    @property
+    def view(self) -> MappingProxyType:
+        return MappingProxyType(self.levels)
+
+    def key(self, price: float) -> float:
+        return price if self.descending else -price
+
+    def price(self, key: float) -> float:
+        return key if self.descending else -key
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def __bool__(self) -> bool:
+        return bool(self.levels)
+
+    def __contains__(self, price: float) -> bool:
+        return price in self.levels
+
+    def __getitem__(self, price: float):
+        return self.levels[price]
+
+    @property
+    def best(self) -> float | None:
+        """
+        Best price on this side, highest bid or lowest offer
+        """
+        if self.keys:
+            return self.price(self.keys[-1])
+        return None
+
+    @property
+    def worst(self) -> float | None:
+        """
+        Worst price on this side, lowest bid or highest offer
+        """
+        if self.keys:
+            return self.price(self.keys[0])
+        return None
+
+    def level(self, price: float):
+        """
+        Returns the level at price, creating it if it does not exist yet
+        """
+        level = self.levels.get(price)
+        if level is None:
+            level = self.levels[price] = self.factory()
+            key = self.key(price)
+            self.keys.insert(bisect_left(self.keys, key), key)
+        return level
+
+    def remove(self, price: float) -> None:
+        """
+        Drops the level at price
+        """
+        del self.levels[price]
+        key = self.key(price)
+        if self.keys[-1] == key: # touch, the common case when sweeping
+            self.keys.pop()
+        else:
+            self.keys.pop(bisect_left(self.keys, key))
+
+    def sizes(self):
+        """
+        (price, total quantity) of every level, in no particular order
+        """
+        for price, level in self.levels.items():
+            yield price, level.total
+
+    def depth(self, n: int | None = None) -> list[tuple]:
+        """
+        (price, total quantity, order count) of the best n levels, best first, in O(n)
+        """
+        levels = self.levels
+        return [(price, total, len(levels[price].handles)) for price, total in self.top(n)]
+
+    def top(self, n: int | None = None) -> list[tuple]:
+        """
+        (price, total quantity) of the best n levels, best first, in O(n)
+        """
+        keys = self.keys if n is None else self.keys[-n:] if n > 0 else []
+        levels = self.levels
+        if self.descending:
+            return [(key, levels[key].total) for key in reversed(keys)]
+        return [(-key, levels[-key].total) for key in reversed(keys)]
+
+    def prices(self) -> list[float]:
+        """
+        All prices on this side, best first
+        """
+        return [self.price(key) for key in reversed(self.keys)]
+
+
+class DenseLadder:
+
+    def __init__(self, descending: bool, width: int = 1024, factory = PriceLevel) -> None:
+        '''
+        Price ladder over integer tick prices backed by a fixed-width array of levels around the touch
+
+        Same interface as PriceLadder. Levels inside the window sit in slots indexed by sort key, the
+        touch is a cursor into the array and sweeping moves it slot by slot. Prices outside the window
+        go to a PriceLadder of outliers, the window recentres on the touch whenever it drifts out.
+        @param descending: boolean, TRUE=best price is the highest (bids), FALSE=best price is the lowest (offers)
+        @param width: number of tick prices in the window
+        '''
+        self.descending = descending
+        self.factory = factory
+        self.width = width
+
+        # price -> level, every level in the window or not
+        self.levels: dict = {}
+
+        # slot i holds the level with sort key base + i, keys as in PriceLadder (best is the highest)
+        self.slots: list = [None] * width
+        self.base: int | None = None
+        self.count = 0 # occupied slots
+        self.hi = -1 # best occupied slot
+        self.lo = width # worst occupied slot
+
+        self.outliers = PriceLadder(descending, factory)
+
+    @property
+    def view(self) -> MappingProxyType:
+        return MappingProxyType(self.levels)
+
+    def key(self, price: int) -> int:
+        return price if self.descending else -price
+
+    def price(self, key: int) -> int:
+        return key if self.descending else -key
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def __bool__(self) -> bool:
+        return bool(self.levels)
+
+    def __contains__(self, price: int) -> bool:
+        return price in self.levels
+
+    def __getitem__(self, price: int):
+        return self.levels[price]
+
+    def slot(self, key: int) -> int | None:
+        idx = key - self.base if self.base is not None else -1
+        return idx if 0 <= idx < self.width else None
+
+    @property
+    def best(self) -> int | None:
+        """
+        Best price on this side, highest bid or lowest offer
+        """
+        outliers = self.outliers.keys
+        if self.count:
+            key = self.base + self.hi
+            if outliers and outliers[-1] > key: # outlier above the window
+                key = outliers[-1]
+            return self.price(key)
+        if outliers:
+            return self.price(outliers[-1])
+        return None
+
+    @property
+    def worst(self) -> int | None:
+        """
+        Worst price on this side, lowest bid or highest offer
+        """
+        outliers = self.outliers.keys
+        if self.count:
+            key = self.base + self.lo
+            if outliers and outliers[0] < key: # outlier below the window
+                key = outliers[0]
+            return self.price(key)
+        if outliers:
+            return self.price(outliers[0])
+        return None
+
+    def level(self, price: int):
+        """
+        Returns the level at price, creating it if it does not exist yet
+        """
+        level = self.levels.get(price)
+        if level is not None:
+            return level
+
+        key = self.key(price)
+        if not self.count or key >= self.base + self.width:
+            # first level, or a new touch beyond the window
+            level = self.levels[price] = self.factory()
+            self.recentre(key)
+            return level
+
+        idx = self.slot(key)
+        if idx is None: # deep in the book
+            level = self.outliers.level(price)
+        else:
+            level = self.slots[idx] = self.factory()
+            self.count += 1
+            if idx > self.hi:
+                self.hi = idx
+            if idx < self.lo:
+                self.lo = idx
+
+        self.levels[price] = level
+        return level
+
+    def remove(self, price: int) -> None:
+        """
+        Drops the level at price
+        """
+        del self.levels[price]
+        idx = self.slot(self.key(price))
+        if idx is None or self.slots[idx] is None:
+            self.outliers.remove(price)
+            return
+
+        slots = self.slots
+        slots[idx] = None
+        self.count -= 1
+        if not self.count:
+            self.hi, self.lo = -1, self.width
+            if self.outliers: # the touch has drifted out of the window
+                self.recentre(self.key(self.best))
+            return
+
+        # walk the cursors over the empty slots, a sweep moves them one level at a time
+        if idx == self.hi:
+            idx -= 1
+            while slots[idx] is None:
+                idx -= 1
+            self.hi = idx
+        elif idx == self.lo:
+            idx += 1
+            while slots[idx] is None:
+                idx += 1
+            self.lo = idx
+
+    def recentre(self, key: int) -> None:
+        """
+        Move the window so the touch at key sits in its middle, levels outside it become outliers
+        """
+        self.base = key - self.width // 2
+        self.slots = [None] * self.width
+        self.count = 0
+        self.hi, self.lo = -1, self.width
+        self.outliers = PriceLadder(self.descending, self.factory)
+
+        outliers = self.outliers
+        for price, level in self.levels.items():
+            key = self.key(price)
+            idx = self.slot(key)
+            if idx is None:
+                outliers.levels[price] = level
+                outliers.keys.append(key)
+                continue
+            self.slots[idx] = level
+            self.count += 1
+            if idx > self.hi:
+                self.hi = idx
+            if idx < self.lo:
+                self.lo = idx
+        outliers.keys.sort()
+
+    def iter_keys(self):
+        """
+        Sort keys best first, outliers above the window, the window, then outliers below it
+        """
+        outliers = self.outliers.keys
+        top = self.base + self.width if self.base is not None else None
+        split = bisect_left(outliers, top) if top is not None else 0
+        yield from reversed(outliers[split:])
+        if self.count:
+            slots = self.slots
+            base = self.base
+            for idx in range(self.hi, self.lo - 1, -1):
+                if slots[idx] is not None:
+                    yield base + idx
+        yield from reversed(outliers[:split])
+
+    def sizes(self):
+        """
+        (price, total quantity) of every level, in no particular order
+        """
+        for price, level in self.levels.items():
+            yield price, level.total
+
+    def top(self, n: int | None = None) -> list[tuple]:
+        """
+        (price, total quantity) of the best n levels, best first, in O(n) plus the empty slots skipped
+        """
+        result = []
+        if n is not None and n <= 0:
+            return result
+        levels = self.levels
+        for key in self.iter_keys():
+            price = self.price(key)
+            result.append((price, levels[price].total))
+            if n is not None and len(result) >= n:
+                break
+        return result
+
+    def depth(self, n: int | None = None) -> list[tuple]:
+        """
+        (price, total quantity, order count) of the best n levels, best first
+        """
+        levels = self.levels
+        return [(price, total, len(levels[price].handles)) for price, total in self.top(n)]
+
+    def prices(self) -> list[int]:
+        """
+        All prices on this side, best first
+        """
+        return [self.price(key) for key in self.iter_keys()]
@@ -0,0 +1,111 @@
+import time
+
+from typing import Callable, Dict, List, Tuple
+
+
+DEFAULT_LEVELS = 10
+
+
+class DepthPublisher:
+
+    def __init__(self, levels: int = DEFAULT_LEVELS, interval: float = 0.0, clock: Callable[[], float] = time.monotonic) -> None:
+        '''
+        Publishes top of book and N-level depth deltas of the books it is attached to, in decimal prices
+
+        Books only mark themselves changed, the depth is read from the level totals when a
+        publish is due, so a burst of updates within one interval is conflated into one delta.
+        @param levels: price levels per side in the depth messages
+        @param interval: conflation interval in seconds, 0 publishes after every change
+        @param clock: time source for the interval, seconds
+        '''
+        self.levels = levels
+        self.interval = interval
+        self.clock = clock
+        self.subscribers: List[Callable[[dict], None]] = []
+
+        # instrument -> book changed since the last publish
+        self.dirty: Dict[str, object] = {}
+        # instrument -> last published (bids, offers) and top of book
+        self.published: Dict[str, Tuple[list, list]] = {}
+        self.tops: Dict[str, tuple] = {}
+        self.due = 0.0
+
+    def attach(self, book) -> None:
+        book.market_data = self
+
+    def subscribe(self, callback: Callable[[dict], None]) -> None:
+        '''
+        callback(message) is called with every top, depth and snapshot message
+        '''
+        self.subscribers.append(callback)
+
+    def send(self, message: dict) -> None:
+        for callback in self.subscribers:
+            callback(message)
+
+    def touch(self, book) -> None:
+        '''
+        Called by a book after every change
+        '''
+        self.dirty[book.instrument] = book
+        now = self.clock()
+        if now >= self.due:
+            self.publish(now)
+
+    def publish(self, now: float | None = None) -> None:
+        '''
+        Send the deltas of every book changed since the last publish
+        '''
+        for instrument, book in self.dirty.items():
+            bids = book.bid_ladder.top(self.levels)
+            offers = book.offer_ladder.top(self.levels)
+
+            to_price = book.ticks.to_price
+            top = (bids[0] if bids else (None, None)) + (offers[0] if offers else (None, None))
+            if top != self.tops.get(instrument):
+                self.tops[instrument] = top
+                self.send({'type': 'top', 'instrument': instrument, 'bid': (to_price(top[0]), top[1]), 'offer': (to_price(top[2]), top[3])})
+
+            last_bids, last_offers = self.published.get(instrument, ([], []))
+            bid_changes = delta(last_bids, bids)
+            offer_changes = delta(last_offers, offers)
+            if bid_changes or offer_changes:
+                self.published[instrument] = (bids, offers)
+                self.send({
+                    'type': 'depth',
+                    'instrument': instrument,
+                    'bids': [(to_price(price), size) for price, size in bid_changes],
+                    'offers': [(to_price(price), size) for price, size in offer_changes]
+                })
+
+        self.dirty.clear()
+        self.due = (self.clock() if now is None else now) + self.interval
+
+    def snapshot(self, book, levels: int | None = None) -> dict:
+        '''
+        Full depth of a book, sent to subscribers and returned
+        @param levels: price levels per side, None for the whole book
+        '''
+        to_price = book.ticks.to_price
+        bids, offers = book.depth(levels)
+        message = {
+            'type': 'snapshot',
+            'instrument': book.instrument,
+            'bids': [(to_price(price), size, count) for price, size, count in bids],
+            'offers': [(to_price(price), size, count) for price, size, count in offers]
+        }
+        self.send(message)
+        return message
+
+
+def delta(old: List[tuple], new: List[tuple]) -> List[tuple]:
+    '''
+    (price, size) changes between two depth views, size 0 for a level that left the view
+    '''
+    if old == new:
+        return []
+    before = dict(old)
+    after = dict(new)
+    changes = [(price, size) for price, size in new if before.get(price) != size]
+    changes.extend((price, 0) for price in before if price not in after)
+    return changes
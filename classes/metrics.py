@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+
+from typing import Dict, List
+
+
+# Stages of OrderBook.process_order, in ns per order. match includes the log and position time of its fills
+ORDER, RISK, AUCTION, INSERT, MATCH, LOG, POSITION = STAGES = (
+    'order', 'risk', 'auction', 'insert', 'match', 'log', 'position'
+)
+
+# Per-instrument counters, orders counts each new, cancel and amend event once
+ORDERS, FILLS, REJECTS = range(3)
+COUNTERS = ('orders', 'fills', 'rejects')
+
+# Histogram resolution, 2^SUB_BITS linear buckets per power of two (~3% error), values up to 2^MAX_BITS ns (~18 min)
+SUB_BITS = 5
+MAX_BITS = 40
+SUB = 1 << SUB_BITS
+SIZE = (MAX_BITS - SUB_BITS + 1) << SUB_BITS
+
+DEFAULT_DUMP_EVERY = 10.0
+
+
+class Histogram:
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self) -> None:
+        '''
+        Fixed-size log-linear (HDR style) histogram of non-negative integer values
+        '''
+        self.buckets: List[int] = [0] * SIZE
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def index(value: int) -> int:
+        bits = value.bit_length()
+        if bits <= SUB_BITS + 1: # exact below 2 * SUB
+            return value
+        shift = bits - SUB_BITS - 1
+        idx = ((shift + 1) << SUB_BITS) + (value >> shift) - SUB
+        return idx if idx < SIZE else SIZE - 1
+
+    @staticmethod
+    def upper(idx: int) -> int:
+        '''
+        Highest value counted in bucket idx
+        '''
+        if idx < 2 * SUB:
+            return idx
+        shift = (idx >> SUB_BITS) - 1
+        return ((SUB + (idx & (SUB - 1))) << shift) + (1 << shift) - 1
+
+    def record(self, value: int) -> None:
+        # index() inlined, this runs several times per order
+        bits = value.bit_length()
+        if bits <= SUB_BITS + 1:
+            idx = value
+        else:
+            shift = bits - SUB_BITS - 1
+            idx = ((shift + 1) << SUB_BITS) + (value >> shift) - SUB
+            if idx >= SIZE:
+                idx = SIZE - 1
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct: float) -> int:
+        '''
+        Value at or below which pct percent of the recorded values fall, to the bucket resolution
+        '''
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(self.upper(idx), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: 'Histogram') -> None:
+        buckets = self.buckets
+        for idx, n in enumerate(other.buckets):
+            if n:
+                buckets[idx] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 1),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'max': self.max,
+        }
+
+
+class Metrics:
+
+    def __init__(self, sample_every: int = 1) -> None:
+        '''
+        Stage latencies and per-instrument counters of the order books sharing it
+
+        Books hold None when instrumentation is off, so the disabled cost is one attribute check per stage.
+        @param sample_every: time the stages of every nth order only, the counters always count every event
+        '''
+        self.stages: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        # instrument -> [orders, fills, rejects]
+        self.counters: Dict[str, List[int]] = {}
+        self.started = time.time()
+
+        self.sample_every = sample_every
+        self.skipped = 0
+        self.timing = True # whether the order being processed is timed
+
+    def sample(self) -> bool:
+        '''
+        Called once per order, whether to time it
+        '''
+        self.skipped += 1
+        self.timing = self.skipped >= self.sample_every
+        if self.timing:
+            self.skipped = 0
+        return self.timing
+
+    def record(self, stage: str, elapsed: int) -> None:
+        self.stages[stage].record(elapsed)
+
+    def count(self, instrument: str, counter: int, n: int = 1) -> None:
+        counts = self.counters.get(instrument)
+        if counts is None:
+            counts = self.counters[instrument] = [0] * len(COUNTERS)
+        counts[counter] += n
+
+    def merge(self, other: 'Metrics') -> None:
+        '''
+        Add in the metrics of another process, e.g. a worker's copy
+        '''
+        for stage, histogram in other.stages.items():
+            self.stages[stage].merge(histogram)
+        for instrument, counts in other.counters.items():
+            for counter, n in enumerate(counts):
+                self.count(instrument, counter, n)
+
+    def snapshot(self) -> dict:
+        '''
+        Stage latency summaries in ns and counters per instrument, safe to call while the books run
+        '''
+        return {
+            'time': time.time(),
+            'uptime': time.time() - self.started,
+            'sample_every': self.sample_every,
+            'stages': {stage: histogram.summary() for stage, histogram in self.stages.items()},
+            'instruments': {iid: dict(zip(COUNTERS, counts)) for iid, counts in dict(self.counters).items()},
+        }
+
+    def dump(self, path: str) -> None:
+        '''
+        Write a snapshot as JSON, replacing the file atomically
+        '''
+        partial = path + '.tmp'
+        with open(partial, 'w') as out:
+            json.dump(self.snapshot(), out, indent=2)
+        os.replace(partial, path)
+
+
+class MetricsDumper(threading.Thread):
+
+    def __init__(self, metrics: Metrics, path: str, every: float = DEFAULT_DUMP_EVERY) -> None:
+        '''
+        Background thread dumping metrics to path every so many seconds, and once more on stop()
+        '''
+        super().__init__(name='metrics-dump', daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.every = every
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.every):
+            self.metrics.dump(self.path)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+        self.metrics.dump(self.path)
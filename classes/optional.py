@@ -0,0 +1,16 @@
+import importlib
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def optional_import(name: str):
+    '''
+    Import an optional dependency on first use, returns None if it is not installed
+
+    Keeps packages like numpy, which take longer to import than the engine itself, off the startup path
+    '''
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
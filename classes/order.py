@@ -1,24 +1,38 @@
-import csv
 import datetime
 import os
-import heapq, logging
-import copy
 
-from typing import Dict, List, Tuple
-from collections import defaultdict
-from queue import Queue
+from time import perf_counter_ns
 
-from .instrument import Instrument
+from typing import Dict, List, Mapping, Tuple
+from itertools import chain
 
+from .clock import MIDNIGHT, WALL_CLOCK, SimulatedClock, WallClock
+from .instrument import Instrument, TickScale
+from .ladder import DenseLadder, PriceLadder, PriceLevel
+from .auction import AuctionResult, uncross
+from .report import EXCHANGE_HEADER, RejectLog, exchange_columns, write_table
+from .tradelog import DEFAULT_TAIL, FileSink, TradeLog
+from .errors import DuplicateOrderId, InvalidSize, OrderNotFound, Rejection
+from .metrics import AUCTION, FILLS, INSERT, LOG, MATCH, ORDER, ORDERS, POSITION, REJECTS, RISK, Metrics
+
+
+# Session boundaries, order times carry the strptime default date
+OPEN_TIME = MIDNIGHT.replace(hour=9, minute=30)
+CLOSE_TIME = MIDNIGHT.replace(hour=16)
+
+# process_order's default, the order has not been through Client.checkStatic yet
+UNCHECKED = object()
 
 
 # from client import Client
 # from instrument import Instrument
 class Trade:
-    def __init__(self, buyer, seller, price: float, volume: int) -> None:
+    __slots__ = ('buyer', 'seller', 'time', 'price', 'volume')
+
+    def __init__(self, buyer, seller, price: float, volume: int, time: datetime.datetime | None = None) -> None:
         self.buyer = buyer
         self.seller = seller
-        self.time = datetime.datetime.now()
+        self.time = time if time is not None else datetime.datetime.now()
         self.price = price
         self.volume = volume
 
@@ -26,6 +40,8 @@ class Trade:
         return f"{self.time} BUY {self.buyer.ID} SELL {self.seller.ID} {self.volume} @ {self.price}"
 
 class Order:
+    __slots__ = ('id', 'time', 'client', 'instrument', 'side', 'rating', 'price', 'quantity', 'result', 'message')
+
     def __init__(self, id: str, time: datetime.datetime.date, client, instrument, side: bool, price: float | None, quantity: float, rating: int) -> None:
         '''
         Class representing a single order
@@ -33,7 +49,7 @@ class Order:
         @param client: Client object
         @param instrument: Instrument object
         @param side: boolean, TRUE=buy, FALSE=sell
-        @param price: optional integer, none=market price
+        @param price: decimal limit price or "Market", held in integer ticks of the instrument
         @param quantity: int
         '''
         # From orderbook
@@ -45,9 +61,9 @@ class Order:
         self.rating: int = rating
 
         if price == "Market":
-            self.price = None
+            self.price: int | None = None
         else:
-            self.price = float(price)
+            self.price = instrument.ticks.to_ticks(float(price))
 
         self.quantity: int | None = quantity
 
@@ -84,141 +100,439 @@ class Order:
             else: # sell
                 return self.price < obj.price
 
+class AuctionOrder:
+    __slots__ = ('id', 'time', 'side', 'price', 'quantity', 'rating')
+
+    def __init__(self, order: Order) -> None:
+        '''
+        Snapshot of an order as it entered an auction, only the fields the auction price needs
+        @param order: Order object, copied by value so later fills do not change the snapshot
+        '''
+        self.id = order.id
+        self.time = order.time
+        self.side: bool = order.side
+        self.price: int | None = order.price
+        self.quantity = order.quantity
+        self.rating: int = order.rating
+
+    def __str__(self):
+        return f"{self.id} {self.side} {self.quantity} @ {self.price}"
+
 
 class OrderBook:
-    def __init__(self, instrument, start_id: int = 0, callback = None) -> None:
+    def __init__(self, instrument, start_id: int = 0, callback = None, trade_store = None, auctions: bool = False, log_tail: int | None = DEFAULT_TAIL, log_sink: FileSink | None = None, ticks: TickScale | None = None, dense_width: int | None = None, metrics: Metrics | None = None, clock: WallClock | SimulatedClock | None = None, registry: Mapping | None = None) -> None:
+        '''
+        Prices inside the book (levels, depth, last_price) are integer ticks, fills are recorded in decimals
+        @param callback: optional fill hook, called as callback(book, buy, sell, price, size, time), price in ticks
+        @param trade_store: optional columnar TradeStore, fills are appended to it instead of allocating a Trade each
+        @param auctions: if true, orders before 09:30 and after 16:00 rest without matching and are uncrossed in a call auction
+        @param log_tail: number of most recent fills kept in the in-memory trade log, None keeps all
+        @param log_sink: optional FileSink the trade log is written to in batches
+        @param ticks: the instrument's TickScale, defaults to the default tick size
+        @param dense_width: if set, index each side with a DenseLadder of this many ticks around the touch
+        @param metrics: optional Metrics the stage latencies and counters are recorded in, None disables them
+        @param clock: what the book stamps events with, defaults to the wall clock, a SimulatedClock in replays
+        @param registry: InstrumentID -> Instrument of the book's exchange, orders for other instruments are rejected, None skips the check
+        '''
         self.instrument: None = instrument
+        self.ticks = ticks if ticks is not None else TickScale()
+        self.clock = clock if clock is not None else WALL_CLOCK
         self.order_id = start_id
         self.callback = callback
+        self.registry = registry
 
-        self.bids: Dict[int, list] = defaultdict(list)
-        self.offers: Dict[int, list] = defaultdict(list)
+        if dense_width:
+            self.bid_ladder = DenseLadder(descending=True, width=dense_width)
+            self.offer_ladder = DenseLadder(descending=False, width=dense_width)
+        else:
+            self.bid_ladder = PriceLadder(descending=True)
+            self.offer_ladder = PriceLadder(descending=False)
+
+        # Market orders resting during a call phase
+        self.market_bids = PriceLevel()
+        self.market_offers = PriceLevel()
+
+        # order id -> resting Order, for cancels and amends
+        self.resting: Dict[str, Order] = {}
 
-        self.trades = []
-        self.log = []
-        self.errors = []
+        self.auctions: bool = auctions
+        self.in_call: bool = auctions # opening call phase
+        self.closed: bool = False # past 16:00
+        self.last_price: int | None = None
+
+        self.columnar: bool = trade_store is not None
+        self.trades = trade_store if self.columnar else []
+        self.log = TradeLog(instrument, log_tail, log_sink, ticks=self.ticks, clock=self.clock)
+        self.errors = [] # unexpected failures, rejections go to self.rejections
+        self.rejections = RejectLog()
+
+        # optional DepthPublisher, told about every change to the book
+        self.market_data = None
+        self.metrics = metrics
 
         self.pre_orders = []
         self.post_orders = []
+        # order id -> (in pre_orders, index) of the order's auction snapshot, see capture
+        self.auction_index: Dict[str, Tuple[bool, int]] = {}
+
+    @property
+    def bids(self) -> Dict[float, list]:
+        '''
+        Read-only view of the bid levels, price -> level
+        '''
+        return self.bid_ladder.view
 
     @property
-    def max_bid(self) -> float: # max amount people are willing to pay
-        if self.bids:
-            return max(self.bids.keys())
+    def offers(self) -> Dict[float, list]:
+        '''
+        Read-only view of the offer levels, price -> level
+        '''
+        return self.offer_ladder.view
+
+    @property
+    def max_bid(self) -> int: # max amount people are willing to pay
+        if self.bid_ladder:
+            return self.bid_ladder.best
         else:
-            return 0.0
+            return 0
         
     @property
-    def min_bid(self) -> float:
-        if self.bids:
-            return min(self.bids.keys())
-        else:
-            return None
+    def min_bid(self) -> int:
+        return self.bid_ladder.worst
         
     @property
-    def min_offer(self) -> float: # min amount people are willing to sell
-        if self.offers:
-            return min(self.offers.keys())
+    def min_offer(self) -> int | float: # min amount people are willing to sell
+        if self.offer_ladder:
+            return self.offer_ladder.best
         else:
             return float('inf') 
     
     @property
-    def max_offer(self) -> float:
-        if self.offers:
-            return max(self.offers.keys())
-        else:
-            return None
+    def max_offer(self) -> int:
+        return self.offer_ladder.worst
         
-    def calculate_auction_price(self, auction_orders: List[Order]) -> float | None:
-        bids = defaultdict(list)
-        offers = defaultdict(list)
-
-        for order in auction_orders:
-            # print(order)
-            rating = order.rating
-
-            if order.side: # BUY
-                bids[order.price].append(
-                    (rating, order)
-                )
-                heapq.heapify(bids[order.price])
-            else: # SELL
-                offers[order.price].append(
-                    (rating, order)
-                )
-                heapq.heapify(offers[order.price])
+    def calculate_auction_price(self, auction_orders: List[AuctionOrder], reference_price: float | None = None) -> float | None:
+        '''
+        Uncrossing price of a set of auction orders, the price maximising executable volume
+        @param auction_orders: orders captured in pre_orders/post_orders
+        @param reference_price: optional last price in ticks, used as the final tie-break
+        @return: decimal price
+        '''
+        result = uncross(
+            ((order.price, order.quantity) for order in auction_orders if order.side),
+            ((order.price, order.quantity) for order in auction_orders if not order.side),
+            reference_price
+        )
+        return self.ticks.to_price(result.price) if result is not None else None
+
+    def uncross(self, reference_price: float | None = None, time: datetime.datetime | None = None) -> AuctionResult | None:
+        '''
+        Execute the call auction against the resting book at a single price and end the call phase
+
+        Fills go to resting orders in price then queue priority, market orders first. Market orders
+        left over are cancelled, limit orders left over stay in the book for continuous trading.
+        @param reference_price: tie-break price in ticks, defaults to the last traded price
+        @param time: auction time, defaults to the session boundary being crossed
+        '''
+        self.in_call = False
+        if reference_price is None:
+            reference_price = self.last_price
+        if time is None:
+            time = CLOSE_TIME if self.closed else OPEN_TIME
+
+        result = uncross(
+            chain(((None, order.quantity) for _, order in self.market_bids), self.bid_ladder.sizes()),
+            chain(((None, order.quantity) for _, order in self.market_offers), self.offer_ladder.sizes()),
+            reference_price
+        )
+
+        if result is not None:
+            price = result.price
+            buys = self.crossing_levels(self.market_bids, self.bid_ladder, lambda p: p >= price)
+            sells = self.crossing_levels(self.market_offers, self.offer_ladder, lambda p: p <= price)
+
+            buy_level, buy_price = next(buys, (None, None))
+            sell_level, sell_price = next(sells, (None, None))
+            remaining = result.volume
+
+            while remaining > 0 and buy_level is not None and sell_level is not None:
+                _, buy = buy_level.head()
+                _, sell = sell_level.head()
+
+                size = min(buy.quantity, sell.quantity, remaining)
+                buy.quantity -= size
+                sell.quantity -= size
+                buy_level.reduce(size)
+                sell_level.reduce(size)
+                remaining -= size
+
+                self.execute_auction_fill(buy, sell, price, size, time)
+
+                if buy.quantity <= 0:
+                    buy_level.pop()
+                    del self.resting[buy.id]
+                    if not buy_level:
+                        if buy_price is not None:
+                            self.bid_ladder.remove(buy_price)
+                        buy_level, buy_price = next(buys, (None, None))
+
+                if sell.quantity <= 0:
+                    sell_level.pop()
+                    del self.resting[sell.id]
+                    if not sell_level:
+                        if sell_price is not None:
+                            self.offer_ladder.remove(sell_price)
+                        sell_level, sell_price = next(sells, (None, None))
+
+            self.last_price = price
+            if self.closed:
+                buy.instrument.closed_price = price
+
+        # Unexecuted market orders do not carry into continuous trading
+        for market in (self.market_bids, self.market_offers):
+            for _, order in list(market):
+                self.remove_order(order.id)
+
+        if self.market_data is not None:
+            self.market_data.touch(self)
+        return result
+
+    def crossing_levels(self, market: PriceLevel, ladder: PriceLadder, crosses):
+        '''
+        Levels of one side that execute in an auction, market orders first, then best price first
+        '''
+        if market:
+            yield market, None
+        for price in ladder.prices():
+            if not crosses(price):
+                break
+            yield ladder[price], price
+
+    def execute_auction_fill(self, buy: Order, sell: Order, price: int, size: float, time: datetime.datetime) -> None:
+        Instrument.add_matching(buy.instrument, price, size, time)
+        if self.metrics is not None:
+            self.metrics.count(self.instrument, FILLS)
 
-        # get max offer
-        # get min bid
+        if self.columnar:
+            self.trades.add(buy.client, sell.client, self.ticks.to_price(price), size, time)
+        else:
+            self.trades.append(Trade(buy.client, sell.client, self.ticks.to_price(price), size, time))
 
-        max_offer = 0.0
-        min_bid = 100000000.0
+        self.log.add(buy, sell, price, size)
+        if self.callback is not None:
+            self.callback(self, buy, sell, price, size, time)
 
-        for bid in bids:
-            if bid is not None and min_bid > bid:
-                min_bid = bid
+        buy.client.updatePosition(buy.instrument, price, size)
+        if sell.price is None: # limit sells are booked on entry
+            sell.client.updatePosition(sell.instrument, price, -size)
+            sell.client.updateOpenSells(sell.instrument, -size)
 
-        for offer in offers:
-            if offer is not None and max_offer < offer:
-                max_offer = offer
+    def rest_order(self, order: Order, rating: int) -> None:
+        '''
+        Add an order to its side of the book without matching
+        '''
+        if order.price is None: # market order in a call phase
+            (self.market_bids if order.side else self.market_offers).push(rating, order)
+            if not order.side: # not booked until it fills, see Client.checkLimits
+                order.client.updateOpenSells(order.instrument, order.quantity)
+        else:
+            ladder = self.bid_ladder if order.side else self.offer_ladder
+            ladder.level(order.price).push(rating, order)
+        self.resting[order.id] = order
 
-        # print(min_bid)
-        # print(max_offer)
+    def level_of(self, order: Order) -> PriceLevel:
+        '''
+        The queue a resting order sits in
+        '''
+        if order.price is None:
+            return self.market_bids if order.side else self.market_offers
+        return (self.bid_ladder if order.side else self.offer_ladder)[order.price]
 
-        market_bid = bids[None]
-        bids.pop(None)
-        bids[max_offer] = market_bid
+    def remove_order(self, order_id: str) -> Order:
+        '''
+        Take a resting order off the book, returns the order
+        '''
+        order = self.resting.pop(order_id, None)
+        if order is None:
+            raise OrderNotFound("REJECTED - ORDER NOT FOUND")
 
-        market_offer = offers[None]
-        offers.pop(None)
-        offers[min_bid] = market_offer
+        if order.price is None:
+            (self.market_bids if order.side else self.market_offers).cancel(order_id)
+            if not order.side:
+                order.client.updateOpenSells(order.instrument, -order.quantity)
+            return order
 
-        bid_prices = sorted(bids.keys(), reverse=True)
-        offer_prices = sorted(offers.keys())
+        ladder = self.bid_ladder if order.side else self.offer_ladder
+        level = ladder[order.price]
+        level.cancel(order_id)
+        if not level:
+            ladder.remove(order.price)
 
-        # print(offer_prices)
+        if not order.side: # sells are booked against the position on entry
+            order.client.updatePosition(order.instrument, order.price, order.quantity)
 
-        bid_sizes = [sum(o[1].quantity for o in bids[p]) for p in bid_prices]
-        offer_sizes = [sum(o[1].quantity for o in offers[p]) for p in offer_prices]
+        return order
 
-        # for bid 
+    def capture(self, order: Order) -> None:
+        '''
+        Snapshot an accepted order entering before the open or after the close, for the auction prices
+        '''
+        if order.time <= OPEN_TIME:
+            pre, orders = True, self.pre_orders
+        elif order.time >= CLOSE_TIME:
+            pre, orders = False, self.post_orders
+        else:
+            self.auction_index.pop(order.id, None) # a snapshot of an earlier order with this id
+            return
+        self.auction_index[order.id] = (pre, len(orders))
+        orders.append(AuctionOrder(order))
 
-        # # print(bid_prices)
-        # # print(bid_sizes)
+    def auction_snapshot(self, order_id: str, time: datetime.datetime | None) -> AuctionOrder | None:
+        '''
+        Snapshot of a resting order, if the auction it entered has not passed at time
+        '''
+        entry = self.auction_index.get(order_id)
+        if entry is None:
+            return None
+        pre, idx = entry
+        if time is not None and (time > OPEN_TIME if pre else time < CLOSE_TIME):
+            return None
+        return (self.pre_orders if pre else self.post_orders)[idx]
 
-        # print(offer_prices)
-        # print(offer_sizes)
+    def withdraw(self, order_id: str, time: datetime.datetime | None) -> None:
+        '''
+        Drop the auction snapshot of an order cancelled or replaced before its auction, see auction_snapshot
+        '''
+        if self.auction_snapshot(order_id, time) is None:
+            return
+        pre, idx = self.auction_index.pop(order_id)
+        orders = self.pre_orders if pre else self.post_orders
+        last = orders.pop()
+        if idx < len(orders): # move the last snapshot into the gap
+            orders[idx] = last
+            if self.auction_index.get(last.id) == (pre, len(orders)):
+                self.auction_index[last.id] = (pre, idx)
+
+    def reject(self, order_id: str, reason: type, time: datetime.datetime | None) -> None:
+        self.rejections.add(order_id, reason, time)
+        if self.metrics is not None:
+            self.metrics.count(self.instrument, REJECTS)
+
+    def record_error(self, order_id: str, time: datetime.datetime | None, e: Exception) -> None:
+        '''
+        Rejections raised off the entry path go to the reject log, anything else to errors
+        '''
+        if isinstance(e, Rejection):
+            self.reject(order_id, type(e), time)
+        else:
+            self.errors.append(f"{order_id}|{time}|{e}")
 
-        bid_to_qty = dict(zip(bid_prices, bid_sizes))
-        bid_with_most = max(bid_to_qty, key = lambda x: bid_to_qty[x])
-        bid_most_qty = bid_to_qty[bid_with_most]
+    def cancel_order(self, order_id: str, time: datetime.datetime | None = None) -> Order | None:
+        '''
+        Cancel a resting order, returns the cancelled order
+        '''
+        if self.metrics is not None:
+            self.metrics.count(self.instrument, ORDERS)
+        if order_id not in self.resting:
+            self.reject(order_id, OrderNotFound, time)
+            return None
+        try:
+            order = self.remove_order(order_id)
+            self.withdraw(order_id, time)
+            return order
+        except Exception as e:
+            self.record_error(order_id, time, e)
+        finally:
+            if self.market_data is not None:
+                self.market_data.touch(self)
 
-        offer_to_qty = dict(zip(offer_prices, offer_sizes))
-        sorted_offer_to_qty = {key : offer_to_qty[key] for key in sorted(offer_to_qty.keys())}
+    def amend_order(self, order_id: str, qty: float, price: int | None = None, time: datetime.datetime | None = None) -> Order | None:
+        '''
+        Amend the remaining quantity and/or price of a resting order, returns the amended order
 
-        for price, qty in sorted_offer_to_qty.items():
-            bid_most_qty -= qty
+        Reducing the quantity at the same price keeps queue priority, any other
+        amend is a cancel/replace that goes through matching again at the back of the queue.
+        @param qty: new remaining quantity, 0 cancels the order
+        @param price: new limit price in ticks, None keeps the current price
+        @param time: time of the amend, used as the new queue time on a replace
+        '''
+        if self.metrics is not None:
+            self.metrics.count(self.instrument, ORDERS)
+        try:
+            order = self.resting.get(order_id)
+            if order is None:
+                self.reject(order_id, OrderNotFound, time)
+                return None
+
+            if qty % order.instrument.lotSize != 0:
+                self.reject(order_id, InvalidSize, time)
+                return None
+
+            if qty == 0:
+                order = self.remove_order(order_id)
+                self.withdraw(order_id, time)
+                return order
+
+            if (price is None or price == order.price) and qty <= order.quantity:
+                if not order.side:
+                    if order.price is not None:
+                        order.client.updatePosition(order.instrument, order.price, order.quantity - qty)
+                    else: # market sells are only booked when they fill
+                        order.client.updateOpenSells(order.instrument, qty - order.quantity)
+                self.level_of(order).reduce(order.quantity - qty)
+                snapshot = self.auction_snapshot(order_id, time)
+                if snapshot is not None:
+                    snapshot.quantity -= order.quantity - qty
+                order.quantity = qty
+                return order
+
+            self.remove_order(order_id)
+            self.withdraw(order_id, time)
+            order.quantity = qty
+            if price is not None:
+                order.price = price
+            if time is not None:
+                order.time = time
+            self.process_order(order, order.rating, replace=True)
+            return order
 
-            if bid_most_qty <= 0:
-                return price
+        except Exception as e:
+            self.record_error(order_id, time, e)
+        finally:
+            if self.market_data is not None:
+                self.market_data.touch(self)
 
-        
     def get_new_order_id(self) -> int:
         self.order_id += 1
         return self.order_id
     
     
-    def generate_trade_log(self, incoming_order: Order, book_order, price: float, size: int) -> str:
-        return f"{datetime.datetime.now()} EXECUTE: {incoming_order.client} #{incoming_order.id} BUY {book_order.client} #{book_order.id} SELL {size} {self.instrument} @ {price}"
-        
-    def process_order(self, incoming_order: Order, rating: int) -> None:
+    def process_order(self, incoming_order: Order, rating: int, precheck = UNCHECKED, replace: bool = False) -> None:
         '''
         Attempt to fill an incoming order, if not add to OB
+        @param precheck: result of Client.checkStatic if it already ran for this order, see process_orders
+        @param replace: the order is the replace of an amend, which counted the event already
         '''
+        metrics = self.metrics
+        timer = None
+        if metrics is not None:
+            if not replace:
+                metrics.count(self.instrument, ORDERS)
+            if metrics.sample(): # the counters are exact, stage timings are sampled
+                timer = metrics
+                start = perf_counter_ns()
+
         new_ts = incoming_order.time
         new_order_id = self.get_new_order_id()
 
-        if incoming_order.price is None: # Market order
+        if self.auctions:
+            call = new_ts <= OPEN_TIME or new_ts >= CLOSE_TIME
+            if self.in_call and not call: # opening auction
+                self.uncross()
+            elif call and not self.in_call and new_ts >= CLOSE_TIME: # closing call phase starts
+                self.in_call = self.closed = True
+
+        if incoming_order.price is None and not self.in_call: # Market order
             if incoming_order.side: # BUY at highest sell price
                 incoming_order.price = self.max_offer
             else: # SELL at lowest buy price
@@ -227,48 +541,152 @@ class OrderBook:
         order_client = incoming_order.client
 
         try:
-            order_client.checkOrder(incoming_order)
-
-            # before start
-            if incoming_order.time <= datetime.datetime.strptime("09:30:00", "%H:%M:%S"):
-                # print(incoming_order.time)
-                # print(incoming_order)
-                self.pre_orders.append(copy.deepcopy(incoming_order))
-            # after end
-            elif incoming_order.time >= datetime.datetime.strptime("16:00:00", "%H:%M:%S"):
-                # print(incoming_order.time)
-                self.post_orders.append(copy.deepcopy(incoming_order))
-
-            if incoming_order.side: # BUY
-                if incoming_order.price >= self.min_offer and self.offers:
+            if timer is not None:
+                checked = perf_counter_ns()
+            if precheck is UNCHECKED:
+                reason = order_client.checkOrder(incoming_order, self.registry)
+            else:
+                reason = precheck or order_client.checkLimits(incoming_order)
+            if reason is None and incoming_order.id in self.resting: # the book tracks resting orders by id
+                reason = DuplicateOrderId
+            if timer is not None:
+                mark = perf_counter_ns()
+                timer.record(RISK, mark - checked)
+            if reason is not None:
+                self.reject(incoming_order.id, reason, incoming_order.time)
+                return
+
+            # before start or after end
+            self.capture(incoming_order)
+
+            if timer is not None:
+                # session checks and uncross before the risk check, auction capture after it
+                now = perf_counter_ns()
+                timer.record(AUCTION, checked - start + now - mark)
+                mark = now
+            stage = INSERT
+
+            if self.in_call: # no matching until the uncross
+                if not incoming_order.side and incoming_order.price is not None:
+                    incoming_order.client.updatePosition(incoming_order.instrument, incoming_order.price, -incoming_order.quantity)
+                self.rest_order(incoming_order, rating)
+
+            elif incoming_order.side: # BUY
+                if incoming_order.price >= self.min_offer and self.offer_ladder:
+                    stage = MATCH
                     self.process_match(incoming_order, rating)
                 else:
-                    self.bids[incoming_order.price].append(
-                        (rating, incoming_order)
-                    )
-                    heapq.heapify(self.bids[incoming_order.price])
+                    self.rest_order(incoming_order, rating)
             else: # SELL
                 incoming_order.client.updatePosition(incoming_order.instrument, incoming_order.price, -incoming_order.quantity)
 
-                if incoming_order.price <= self.max_bid and self.bids:
+                if incoming_order.price <= self.max_bid and self.bid_ladder:
+                    stage = MATCH
                     self.process_match(incoming_order, rating)
                 else:
-                    self.offers[incoming_order.price].append(
-                        (rating, incoming_order)
-                    )
-                    heapq.heapify(self.offers[incoming_order.price])
+                    self.rest_order(incoming_order, rating)
+
+            if timer is not None:
+                timer.record(stage, perf_counter_ns() - mark)
 
         except Exception as e:
-            self.errors.append(f"{incoming_order.id}|{incoming_order.time}|{e}")
+            self.record_error(incoming_order.id, incoming_order.time, e)
+        finally:
+            if self.market_data is not None:
+                self.market_data.touch(self)
+            if timer is not None:
+                timer.record(ORDER, perf_counter_ns() - start)
+
+    def process_orders(self, orders: List[Order], prechecks: list | None = None) -> None:
+        '''
+        Process a batch of new orders, with the same outcome as process_order on each in turn
+
+        Orders that cannot match are checked and booked as they come but only put in the ladder
+        level by level, each level taking all of its new orders at once, before the next order that
+        matches and at the end of the batch. Orders that match, market orders and orders in or at
+        the edge of a call phase go through process_order. Rested orders are published once, at the end.
+        @param orders: new orders of this book, in arrival order
+        @param prechecks: Client.checkStatic of each order, checked here in order when None
+        '''
+        if prechecks is None:
+            prechecks = [order.client.checkStatic(order, self.registry) for order in orders]
+
+        # price -> [(rating, order)] not yet in the ladder
+        bids: Dict[int, list] = {}
+        offers: Dict[int, list] = {}
+
+        def insert() -> None:
+            for ladder, pending in ((self.bid_ladder, bids), (self.offer_ladder, offers)):
+                for price, queue in pending.items():
+                    ladder.level(price).extend(queue)
+                pending.clear()
+
+        # best prices of the ladders and the pending orders together, only process_order moves them down
+        best_bid = self.bid_ladder.best if self.bid_ladder else None
+        best_offer = self.offer_ladder.best if self.offer_ladder else None
+        rested = False
+        try:
+            for order, precheck in zip(orders, prechecks):
+                price = order.price
+                time = order.time
+                if price is None:
+                    crosses = True
+                elif order.side:
+                    crosses = best_offer is not None and price >= best_offer
+                else:
+                    crosses = best_bid is not None and price <= best_bid
+
+                if crosses or self.metrics is not None or (self.auctions and (self.in_call or time <= OPEN_TIME or time >= CLOSE_TIME)):
+                    if bids or offers:
+                        insert()
+                    self.process_order(order, order.rating, precheck)
+                    best_bid = self.bid_ladder.best if self.bid_ladder else None
+                    best_offer = self.offer_ladder.best if self.offer_ladder else None
+                    continue
+
+                # what process_order does for an order that does not cross
+                self.get_new_order_id()
+                try:
+                    client = order.client
+                    reason = precheck or client.checkLimits(order)
+                    if reason is None and order.id in self.resting:
+                        reason = DuplicateOrderId
+                    if reason is not None:
+                        self.reject(order.id, reason, time)
+                        continue
+
+                    self.capture(order)
+
+                    if order.side:
+                        bids.setdefault(price, []).append((order.rating, order))
+                        if best_bid is None or price > best_bid:
+                            best_bid = price
+                    else:
+                        client.updatePosition(order.instrument, price, -order.quantity)
+                        offers.setdefault(price, []).append((order.rating, order))
+                        if best_offer is None or price < best_offer:
+                            best_offer = price
+                    self.resting[order.id] = order
+                    rested = True
+
+                except Exception as e:
+                    self.record_error(order.id, time, e)
+
+            insert()
+        finally:
+            if rested and self.market_data is not None:
+                self.market_data.touch(self)
 
     def process_match(self, incoming_order: Order, rating: int, store_trade: bool = True) -> None:
         '''
         Matching algo, price-time (add rating later) priority
         '''
         is_sell: bool = not incoming_order.side
+        metrics = self.metrics
+        timer = metrics if metrics is not None and metrics.timing else None
+        logged = positioned = 0 # ns spent logging and updating positions, over all fills
 
-        levels: List[float] = self.bids if is_sell else self.offers
-        prices: List[float] = sorted(levels.keys(), reverse=is_sell)
+        ladder: PriceLadder = self.bid_ladder if is_sell else self.offer_ladder
 
         def does_not_match(book_price: float) -> bool:
             if is_sell:
@@ -276,15 +694,19 @@ class OrderBook:
             else:
                 return incoming_order.price < book_price
             
-        for price_idx, price in enumerate(prices):
+        while ladder:
+            # Best price first, levels are removed below once swept empty
+            price = ladder.best
+
             # Check here?
             if incoming_order.quantity == 0 or does_not_match(price):
                 break
 
-            # order_pq: List[Tuple[int, Order]] = levels[price]
+            level: PriceLevel = ladder[price]
 
-            for order_idx, book_order_with_rating in enumerate(levels[price]):
-                rating, book_order = book_order_with_rating
+            # Fill from the head of the queue until either side runs out
+            while level and incoming_order.quantity > 0:
+                _, book_order = level.head()
 
                 incoming_qty: int = max(0, incoming_order.quantity) # guaranteed > 0 ?
                 book_qty: int = max(0, book_order.quantity)
@@ -295,24 +717,53 @@ class OrderBook:
 
                 incoming_order.quantity -= trade_size
                 book_order.quantity -= trade_size
+                level.reduce(trade_size)
+
+                if book_order.quantity <= 0:
+                    level.pop()
+                    del self.resting[book_order.id]
 
                 if trade_size == 0:
                     continue
 
-                Instrument.add_matching(incoming_order.instrument, incoming_order.price, trade_size)
+                Instrument.add_matching(incoming_order.instrument, incoming_order.price, trade_size, incoming_order.time)
+                self.last_price = price
+
+                if metrics is not None:
+                    metrics.count(self.instrument, FILLS)
 
                 if store_trade:
-                    self.trades.append(
-                        Trade(
-                            incoming_order.client,
-                            book_order.client,
-                            book_order.price,
-                            trade_size
+                    if timer is not None:
+                        mark = perf_counter_ns()
+
+                    buy, sell = (book_order, incoming_order) if is_sell else (incoming_order, book_order)
+                    if self.columnar:
+                        self.trades.add(
+                            buy.client,
+                            sell.client,
+                            self.ticks.to_price(book_order.price),
+                            trade_size,
+                            incoming_order.time
+                        )
+                    else:
+                        self.trades.append(
+                            Trade(
+                                buy.client,
+                                sell.client,
+                                self.ticks.to_price(book_order.price),
+                                trade_size,
+                                incoming_order.time
+                            )
                         )
-                    )
 
-                    res: str = self.generate_trade_log(incoming_order, book_order, price, trade_size)
-                    self.log.append(res)
+                    self.log.add(buy, sell, price, trade_size)
+                    if self.callback is not None:
+                        self.callback(self, buy, sell, price, trade_size, incoming_order.time)
+
+                    if timer is not None:
+                        now = perf_counter_ns()
+                        logged += now - mark
+                        mark = now
 
                     # if not is_sell:
                     #     incoming_order.client.updatePosition(incoming_order.instrument, incoming_order.price, -trade_size)
@@ -323,44 +774,55 @@ class OrderBook:
                     if book_order.side:
                         book_order.client.updatePosition(book_order.instrument, book_order.price, trade_size)
 
+                    if timer is not None:
+                        positioned += perf_counter_ns() - mark
 
-            # Remove orders with quantity 0
-            levels[price] = [o for o in levels[price] if o[1].quantity > 0]
 
-            # for order_w_rating in levels[price]:
-            #     rating, order = order_w_rating
-            #     print(rating, order.quantity)
-
-            heapq.heapify(levels[price])
+            if not level: # no more orders at price
+                ladder.remove(price)
+            else:
+                break
 
-            if len(levels[price]) == 0: # no more orders at price
-                levels.pop(price)
+        if timer is not None and logged:
+            timer.record(LOG, logged)
+            timer.record(POSITION, positioned)
 
         if incoming_order.quantity > 0:
-            orders_at_side = self.offers if is_sell else self.bids
-            orders_at_side[incoming_order.price].append((rating, incoming_order))
+            self.rest_order(incoming_order, rating)
 
-    def show_book(self):
-        bid_prices = sorted(self.bids.keys(), reverse=True)
-        offer_prices = sorted(self.offers.keys())
+    def depth(self, levels: int | None = None) -> Tuple[list, list]:
+        '''
+        (bids, offers) of (price in ticks, total quantity, order count), best first, O(levels)
+        @param levels: number of price levels per side, None for the whole book
+        '''
+        return self.bid_ladder.depth(levels), self.offer_ladder.depth(levels)
 
-        bid_sizes = [sum(o[1].quantity for o in self.bids[p]) for p in bid_prices]
-        offer_sizes = [sum(o[1].quantity for o in self.offers[p]) for p in offer_prices]
+    def top_of_book(self) -> tuple:
+        '''
+        (bid price, bid size, offer price, offer size), prices in ticks, None where a side is empty
+        '''
+        bids, offers = self.depth(1)
+        bid = bids[0][:2] if bids else (None, None)
+        offer = offers[0][:2] if offers else (None, None)
+        return bid + offer
+
+    def show_book(self):
+        bids, offers = self.depth()
 
         print()
         print("=== BOOK ===")
 
         print('SELL')
-        if len(offer_prices) == 0:
+        if len(offers) == 0:
             print('NO SELLS')
-        for idx, price in reversed(list(enumerate(offer_prices))):
-            print(f"{idx + 1} {price} {offer_sizes[idx]}")
+        for idx, (price, size, _) in reversed(list(enumerate(offers))):
+            print(f"{idx + 1} {self.ticks.to_price(price)} {size}")
 
         print('BUY')
-        if len(bid_prices) == 0:
+        if len(bids) == 0:
             print('NO BUYS')
-        for idx, price in list(enumerate(bid_prices)):
-            print(f"{idx + 1} {price} {bid_sizes[idx]}")
+        for idx, (price, size, _) in enumerate(bids):
+            print(f"{idx + 1} {self.ticks.to_price(price)} {size}")
 
         print()
 
@@ -371,6 +833,9 @@ class OrderBook:
             for log in self.log:
                 print(log)
 
+            for order_id, reason in self.rejections:
+                print(f"{order_id}|{reason.message}")
+
             for error in self.errors:
                 print(error)
 
@@ -379,26 +844,5 @@ class OrderBook:
 
 outputReportPath = os.path.join('reports', 'output_exchange_report.csv')
 
-def generateExchangeReport(exchanges:list[OrderBook]):
-    with open(outputReportPath, 'w') as report:
-        
-        fieldnames = ['OrderID', 'RejectionReason']
-        writer = csv.DictWriter(report, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for exchange in exchanges:
-            try: 
-                rows = []
-                for error in exchange.errors:
-                    stuffs = error.split('|')
-                    if 'REJECTED' in stuffs[2]:
-                        rows.append({
-                            'OrderID' : stuffs[0],
-                            'RejectionReason' : stuffs[2]
-                        })
-                writer.writerows(rows)
-            except Exception as e:
-                logging.error(f"Error occured when writing: {e}")
-
-    logging.info('Completed report.')
-    return
\ No newline at end of file
+def generateExchangeReport(exchanges:list[OrderBook], path: str = outputReportPath):
+    write_table(path, EXCHANGE_HEADER, exchange_columns(exchanges))
\ No newline at end of file
@@ -0,0 +1,242 @@
+import csv
+import logging
+import math
+import mmap
+import struct
+
+from typing import Dict, Iterable, Iterator, Tuple
+
+from .clock import parse_time, seconds_of_day, time_of_day
+from .ingest import ACTIONS
+from .optional import optional_import
+from .order import Order
+
+
+MAGIC = b'C2CORDS\x00'
+VERSION = 1
+
+# magic, version, record size, record count
+HEADER = struct.Struct('<8sHHQ')
+# price (nan = market), quantity, seconds since midnight, order id, client (NO_CLIENT if blank), instrument, action, side
+RECORD = struct.Struct('<ddiIIIB?xx')
+# dictionaries after the records, order ids, clients then instruments: entry count, count + 1 offsets
+# into the utf-8 data that follows, so any entry is read without decoding the ones before it
+COUNT = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+SPAN = struct.Struct('<QQ') # start and end of one entry
+
+NO_CLIENT = 0xFFFFFFFF
+
+# RECORD as a NumPy structured dtype, built on first use
+_DTYPE = None
+
+
+def record_dtype():
+    '''
+    NumPy dtype of the records, field for field the same layout as RECORD
+    '''
+    global _DTYPE
+    if _DTYPE is None:
+        np = optional_import('numpy')
+        if np is None:
+            raise RuntimeError("reading binary order files as arrays needs numpy")
+        _DTYPE = np.dtype({
+            'names': ['price', 'quantity', 'time', 'order', 'client', 'instrument', 'action', 'side'],
+            'formats': ['<f8', '<f8', '<i4', '<u4', '<u4', '<u4', 'u1', '?'],
+            'offsets': [0, 8, 16, 20, 24, 28, 32, 33],
+            'itemsize': RECORD.size
+        })
+    return _DTYPE
+
+
+def is_order_file(path: str) -> bool:
+    '''
+    Whether path holds a binary order file rather than CSV
+    '''
+    if path == '-':
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def convert_orders(lines: Iterable[str], path: str) -> int:
+    '''
+    Write CSV order rows (OrderID, Time, Client, Instrument, Side, Price, Quantity and the optional
+    Action) to a binary order file, returns the number of records written
+
+    Rows with a malformed time, price, quantity or action are logged and skipped, as the CSV reader
+    would skip them. Unknown clients and instruments are only found when the file is read.
+    @param lines: iterable of CSV lines, header first
+    '''
+    # value -> dictionary index, in order of first appearance
+    orders: Dict[str, int] = {}
+    clients: Dict[str, int] = {}
+    instruments: Dict[str, int] = {}
+    count = 0
+
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+        for line in csv.DictReader(lines):
+            try:
+                action = line.get('Action') or 'New'
+                if action not in ACTIONS:
+                    raise ValueError(f"unknown action {action}")
+                time = parse_time(line['Time'])
+                price = line['Price'] or 'Market'
+                price = math.nan if price == 'Market' else float(price)
+                quantity = float(line['Quantity'] or 0)
+                client = clients.setdefault(line['Client'], len(clients)) if line['Client'] else NO_CLIENT
+                record = RECORD.pack(
+                    price,
+                    quantity,
+                    seconds_of_day(time),
+                    orders.setdefault(line['OrderID'], len(orders)),
+                    client,
+                    instruments.setdefault(line['Instrument'], len(instruments)),
+                    ACTIONS.index(action),
+                    line['Side'] == 'Buy'
+                )
+            except (KeyError, ValueError) as e:
+                logging.error(f"Skipping order row {line.get('OrderID')}: {e}")
+                continue
+
+            out.write(record)
+            count += 1
+
+        for table in (orders, clients, instruments):
+            raw = [value.encode() for value in table]
+            out.write(COUNT.pack(len(raw)))
+            offset = 0
+            out.write(OFFSET.pack(offset))
+            for value in raw:
+                offset += len(value)
+                out.write(OFFSET.pack(offset))
+            out.write(b''.join(raw))
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count))
+
+    return count
+
+
+class StringTable:
+
+    def __init__(self, buffer, offset: int) -> None:
+        '''
+        Read-only sequence over a dictionary of an order file, entries are decoded when accessed
+        @param offset: where the dictionary starts in buffer
+        '''
+        self.buffer = buffer
+        self.count, = COUNT.unpack_from(buffer, offset)
+        self.offsets = offset + COUNT.size
+        self.data = self.offsets + (self.count + 1) * OFFSET.size
+        size, = OFFSET.unpack_from(buffer, self.data - OFFSET.size)
+        self.end = self.data + size # where the next dictionary starts
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, idx: int) -> str:
+        if not 0 <= idx < self.count:
+            raise IndexError(idx)
+        start, end = SPAN.unpack_from(self.buffer, self.offsets + idx * OFFSET.size)
+        return self.buffer[self.data + start:self.data + end].decode()
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[idx] for idx in range(self.count))
+
+
+class OrderFile:
+
+    def __init__(self, path: str) -> None:
+        '''
+        Binary order file written by convert_orders, memory-mapped read-only
+
+        The records are read in place, through struct or as a NumPy structured array over the
+        mapping, and the order, client and instrument ids only when they are looked up.
+        '''
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, size, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} binary order file")
+
+        self.start = HEADER.size
+        self.end = self.start + self.count * RECORD.size
+        self.orders = StringTable(self.map, self.end)
+        self.clients = StringTable(self.map, self.orders.end)
+        self.instruments = StringTable(self.map, self.clients.end)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> 'OrderFile':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        try:
+            self.map.close()
+        except BufferError:
+            # a records() iterator or array() still reads the mapping, it is unmapped once they are gone
+            pass
+        self.file.close()
+
+    def records(self) -> Iterator[tuple]:
+        '''
+        Raw (price, quantity, seconds, order, client, instrument, action, side) tuples, ids as dictionary indexes
+        '''
+        view = memoryview(self.map)[self.start:self.end]
+        try:
+            yield from RECORD.iter_unpack(view)
+        finally:
+            view.release()
+
+    def array(self):
+        '''
+        The records as a NumPy structured array sharing the file's memory, see record_dtype
+        '''
+        np = optional_import('numpy')
+        if np is None:
+            raise RuntimeError("reading binary order files as arrays needs numpy")
+        return np.frombuffer(self.map, dtype=record_dtype(), count=self.count, offset=self.start)
+
+    def read_orders(self, clients: Dict, instruments: Dict) -> Iterator[Tuple[str, Order]]:
+        '''
+        (action, order) pairs of the file, as ingest.read_orders yields them from the CSV
+
+        Clients and instruments are resolved once, order ids decoded as their records are read,
+        records of unknown clients or instruments are logged and skipped
+        @param clients: ClientID -> Client
+        @param instruments: InstrumentID -> Instrument
+        '''
+        client_of = [clients.get(cid) for cid in self.clients]
+        instrument_of = [instruments.get(iid) for iid in self.instruments]
+        order_ids = self.orders
+
+        for price, quantity, seconds, oid, cid, iid, action, side in self.records():
+            action = ACTIONS[action]
+            instrument = instrument_of[iid]
+            if instrument is None:
+                logging.error(f"Skipping order row {order_ids[oid]}: unknown instrument {self.instruments[iid]}")
+                continue
+            client = client_of[cid] if cid != NO_CLIENT else None
+            if client is None and action == 'New':
+                logging.error(f"Skipping order row {order_ids[oid]}: unknown client {self.clients[cid] if cid != NO_CLIENT else ''}")
+                continue
+
+            yield action, Order(
+                id=order_ids[oid],
+                time=time_of_day(seconds),
+                client=client,
+                instrument=instrument,
+                side=side,
+                price='Market' if price != price else price, # nan
+                quantity=quantity,
+                rating=client.rating if client else None
+            )
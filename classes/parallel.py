@@ -0,0 +1,186 @@
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import pickle
+import traceback
+
+from typing import Dict, Iterable, List
+
+from .client import Client
+from .instrument import Instrument
+from .order import OrderBook
+from .ingest import dispatch, parse_rows
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Per-instrument Client dicts a worker hands back
+CLIENT_STATE = ('positions', 'netPositions', 'openSells')
+
+
+class _ShardPickler(pickle.Pickler):
+    '''
+    Pickles Client/Instrument references by ID so results re-link to the parent's objects
+    '''
+    def persistent_id(self, obj):
+        if isinstance(obj, Client):
+            return ('Client', obj.ID)
+        if isinstance(obj, Instrument):
+            return ('Instrument', obj.instrumentID)
+        return None
+
+
+class _ShardUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, clients: Dict[str, Client], instruments: Dict[str, Instrument]) -> None:
+        super().__init__(file)
+        self.clients = clients
+        self.instruments = instruments
+
+    def persistent_load(self, pid):
+        kind, key = pid
+        if kind == 'Client':
+            return self.clients[key]
+        return self.instruments[key]
+
+
+def _run_worker(inbox, outbox, header: List[str], clients: Dict[str, Client], instruments: Dict[str, Instrument], orderbooks: Dict[str, OrderBook]) -> None:
+    '''
+    Worker process, owns the books of a fixed set of instruments and processes their rows in arrival order
+    '''
+    try:
+        for batch in iter(inbox.get, None):
+            dispatch(parse_rows((dict(zip(header, row)) for row in batch), clients, instruments), orderbooks)
+
+        for ob in orderbooks.values():
+            ob.log.flush()
+
+        result = {
+            'orderbooks' : orderbooks,
+            'instruments' : {iid: vars(instruments[iid]) for iid in orderbooks},
+            'positions' : {
+                c.ID : {
+                    attr : {iid: getattr(c, attr)[iid] for iid in orderbooks if iid in getattr(c, attr)}
+                    for attr in CLIENT_STATE
+                }
+                for c in clients.values()
+            },
+        }
+        buffer = io.BytesIO()
+        _ShardPickler(buffer, pickle.HIGHEST_PROTOCOL).dump(result)
+        outbox.put((os.getpid(), None, buffer.getvalue()))
+
+    except Exception:
+        outbox.put((os.getpid(), traceback.format_exc(), None))
+
+
+def run_sharded(lines: Iterable[str], clients: Dict[str, Client], instruments: Dict[str, Instrument], orderbooks: Dict[str, OrderBook], workers: int | None = None, batch_size: int = DEFAULT_BATCH_SIZE) -> OrderBook | None:
+    '''
+    Process an order file with the books spread over worker processes, returns the last book used
+
+    Every instrument is pinned to one worker and its rows are sent in file order, so each book sees
+    exactly the sequence sequential processing would. Books, instrument statistics, client
+    positions and book metrics are merged back into orderbooks, instruments, clients and the
+    books' Metrics when the stream ends.
+    @param lines: iterable of CSV lines, header first
+    @param clients: ClientID -> Client
+    @param instruments: InstrumentID -> Instrument
+    @param orderbooks: InstrumentID -> OrderBook, replaced by the workers' books
+    @param workers: number of worker processes, defaults to the CPU count
+    @param batch_size: rows sent to a worker at a time
+    @raises ValueError: if a client has an order rate limit, it counts orders across instruments and so across workers
+    '''
+    limited = [c.ID for c in clients.values() if c.maxOrderRate is not None]
+    if limited:
+        raise ValueError(f"clients {', '.join(limited)} have an order rate limit, which cannot be split over workers")
+
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return None
+    instrument_col = header.index('Instrument')
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(orderbooks)))
+
+    # instrument -> worker, in instrument order so the assignment is stable between runs
+    owner = {iid: idx % workers for idx, iid in enumerate(orderbooks)}
+
+    outbox = multiprocessing.Queue()
+    inboxes = [multiprocessing.Queue(maxsize=64) for _ in range(workers)]
+    processes = []
+    for idx in range(workers):
+        owned = {iid: ob for iid, ob in orderbooks.items() if owner[iid] == idx}
+        process = multiprocessing.Process(
+            target=_run_worker,
+            args=(inboxes[idx], outbox, header, clients, instruments, owned),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    last = None
+    batches = [[] for _ in range(workers)]
+    try:
+        for row in reader:
+            idx = owner.get(row[instrument_col])
+            if idx is None:
+                logging.error(f"Skipping order row {row}: unknown instrument {row[instrument_col]}")
+                continue
+
+            last = row[instrument_col]
+            batches[idx].append(row)
+            if len(batches[idx]) >= batch_size:
+                inboxes[idx].put(batches[idx])
+                batches[idx] = []
+
+        for idx, batch in enumerate(batches):
+            if batch:
+                inboxes[idx].put(batch)
+
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+
+    # Drain before joining, a worker cannot exit while its result is still in the pipe
+    results = {}
+    failures = []
+    for _ in range(workers):
+        pid, error, payload = outbox.get()
+        if error is not None:
+            failures.append(error)
+        else:
+            results[pid] = payload
+
+    for process in processes:
+        process.join()
+
+    if failures:
+        raise RuntimeError(f"Order book worker failed:\n{failures[0]}")
+
+    # Each worker counted into its own copy of the books' Metrics, and checked against its own copy of the registry
+    metrics = {iid: ob.metrics for iid, ob in orderbooks.items()}
+    registries = {iid: ob.registry for iid, ob in orderbooks.items()}
+
+    # Merge in worker order, so reports come out the same on every run
+    for process in processes:
+        result = _ShardUnpickler(io.BytesIO(results[process.pid]), clients, instruments).load()
+
+        merged = set()
+        for iid, ob in result['orderbooks'].items():
+            if ob.metrics is not None and id(ob.metrics) not in merged:
+                merged.add(id(ob.metrics))
+                metrics[iid].merge(ob.metrics)
+            ob.metrics = metrics[iid]
+            ob.registry = registries[iid]
+        orderbooks.update(result['orderbooks'])
+
+        for iid, state in result['instruments'].items():
+            vars(instruments[iid]).update(state)
+
+        for cid, state in result['positions'].items():
+            for attr, per_instrument in state.items():
+                getattr(clients[cid], attr).update(per_instrument)
+
+    return orderbooks.get(last)
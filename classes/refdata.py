@@ -0,0 +1,71 @@
+import csv
+import os
+
+from typing import Dict, List, Tuple
+
+from .client import Client
+from .instrument import DEFAULT_TICK_SIZE, Instrument
+
+
+CLIENTS_PATH = os.path.join('classes', 'csv', 'test', 'input_clients.csv')
+INSTRUMENTS_PATH = os.path.join('classes', 'csv', 'test', 'input_instruments.csv')
+
+# absolute path -> ((mtime, size), rows)
+_ROWS: Dict[str, Tuple[Tuple[int, int], List[Dict[str, str]]]] = {}
+
+
+def read_rows(path: str) -> List[Dict[str, str]]:
+    '''
+    Rows of a reference data CSV, read once and cached until the file changes
+    '''
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _ROWS.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(key, newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    _ROWS[key] = (version, rows)
+    return rows
+
+
+def clear_cache() -> None:
+    _ROWS.clear()
+
+
+def client_from_row(row: Dict[str, str]) -> Client:
+    return Client(
+        ID= row['ClientID'],
+        currencies= set(row['Currencies'].split(',')),
+        positionCheck= row['PositionCheck'] == 'Y',
+        rating= int(row['Rating']),
+        maxNotional= float(row['MaxNotional']) if row.get('MaxNotional') else None,
+        maxOrderRate= int(row['MaxOrderRate']) if row.get('MaxOrderRate') else None
+    )
+
+
+def instrument_from_row(row: Dict[str, str], bar_interval: int | None = None) -> Instrument:
+    return Instrument(
+        row['InstrumentID'],
+        row['Currency'],
+        int(row['LotSize']),
+        tickSize= float(row['TickSize']) if row.get('TickSize') else DEFAULT_TICK_SIZE,
+        bar_interval= bar_interval
+    )
+
+
+def load_clients(path: str = CLIENTS_PATH) -> Dict[str, Client]:
+    '''
+    Fresh Clients of a client file, ClientID -> Client. The file is only parsed the first time
+    '''
+    return {row['ClientID']: client_from_row(row) for row in read_rows(path)}
+
+
+def load_instruments(path: str = INSTRUMENTS_PATH, bar_interval: int | None = None) -> Dict[str, Instrument]:
+    '''
+    Fresh Instruments of an instrument file, InstrumentID -> Instrument. The file is only parsed the first time
+    @param bar_interval: optional OHLCV bar size in seconds
+    '''
+    return {row['InstrumentID']: instrument_from_row(row, bar_interval) for row in read_rows(path)}
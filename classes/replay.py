@@ -0,0 +1,76 @@
+import datetime
+import logging
+import time
+
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+
+from .clock import SimulatedClock
+from .order import CLOSE_TIME, OPEN_TIME, Order, OrderBook
+from .ingest import dispatch
+
+
+# Session boundaries a replay reports, (name, time of day, whether events at exactly that time come after it)
+# The books count an order at 09:30:00 into the opening call and one at 16:00:00 into the closing call
+CHECKPOINTS = (('open', OPEN_TIME, False), ('close', CLOSE_TIME, True))
+
+
+class Replay:
+
+    def __init__(self, orderbooks: Dict[str, OrderBook], clock: SimulatedClock, speed: float | None = None, on_checkpoint: Callable[[str, 'Replay'], None] | None = None, checkpoints: Tuple[Tuple[str, datetime.datetime, bool], ...] = CHECKPOINTS) -> None:
+        '''
+        Replays a recorded day of order events against the books, on the event times instead of the wall clock
+        @param clock: SimulatedClock the books were built with, advanced to each event's time
+        @param speed: multiple of real time to pace the events at, None runs as fast as possible
+        @param on_checkpoint: called as on_checkpoint(name, replay) before the first event past each checkpoint
+        @param checkpoints: (name, time, inclusive) in time order, the 09:30 open and 16:00 close by default,
+            inclusive checkpoints fire before the events at exactly their time, the others after them
+        '''
+        self.orderbooks = orderbooks
+        self.clock = clock
+        self.speed = speed
+        self.on_checkpoint = on_checkpoint
+        self.pending = list(checkpoints)
+
+        self.events = 0
+        self.started: float | None = None # wall clock
+        self.first: datetime.datetime | None = None # event time of the first event
+
+    @property
+    def elapsed(self) -> float:
+        '''
+        Wall seconds since the first event
+        '''
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    def paced(self, orders: Iterable[Tuple[str, Order]]) -> Iterator[Tuple[str, Order]]:
+        '''
+        Pass (action, order) pairs on once the clock has reached their time
+        '''
+        for action, order in orders:
+            when = order.time
+            if when is not None:
+                while self.pending and (when > self.pending[0][1] or (when == self.pending[0][1] and self.pending[0][2])):
+                    name, _, _ = self.pending.pop(0)
+                    logging.info(f"Replay reached {name} after {self.events} events, {self.elapsed:.3f}s")
+                    if self.on_checkpoint is not None:
+                        self.on_checkpoint(name, self)
+
+                if self.first is None:
+                    self.first = when
+                    self.started = time.monotonic()
+                elif self.speed:
+                    # wall time this event is due at, events in the past go straight through
+                    wait = (when - self.first).total_seconds() / self.speed - self.elapsed
+                    if wait > 0:
+                        time.sleep(wait)
+
+                self.clock.advance(when)
+
+            self.events += 1
+            yield action, order
+
+    def run(self, orders: Iterable[Tuple[str, Order]]) -> OrderBook | None:
+        '''
+        Replay the events, returns the last book used
+        '''
+        return dispatch(self.paced(orders), self.orderbooks)
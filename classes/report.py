@@ -0,0 +1,234 @@
+import csv
+import datetime
+import importlib.util
+import logging
+import os
+
+from array import array
+from typing import Dict, Iterable, List, Sequence
+
+from .clock import seconds_of_day
+from .errors import REASONS, Rejection
+from .optional import optional_import
+
+
+WRITE_BUFFER = 1 << 20 # 1 MiB
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+CLIENT_HEADER = ['ClientID', 'InstrumentID', 'NetPosition']
+INSTRUMENT_HEADER = ['Instrument ID', 'OpenPrice', 'ClosePrice', 'TotalVolume', 'VWAP', 'DayHigh', 'DayLow']
+EXCHANGE_HEADER = ['OrderID', 'RejectionReason']
+TRADE_SUMMARY_HEADER = ['InstrumentID', 'ClientID', 'BoughtVolume', 'SoldVolume', 'BoughtNotional', 'SoldNotional']
+
+
+class RejectLog:
+
+    def __init__(self) -> None:
+        '''
+        Rejected orders of one OrderBook, stored column-wise with a running count per reason
+        '''
+        self.ids: List[str] = []
+        self.codes = array('B')
+        self.times = array('l') # seconds since midnight, -1 if unknown
+        self.counters: List[int] = [0] * len(REASONS)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return ((order_id, REASONS[code]) for order_id, code in zip(self.ids, self.codes))
+
+    def add(self, order_id: str, reason: type[Rejection], time: datetime.datetime | None = None) -> None:
+        self.ids.append(order_id)
+        self.codes.append(reason.code)
+        self.times.append(seconds_of_day(time) if time is not None else -1)
+        self.counters[reason.code] += 1
+
+    def extend(self, ids: Sequence[str], codes: Sequence[int], times: Sequence[int]) -> None:
+        '''
+        Append rejections in column form, as read back from ids, codes and times
+        '''
+        self.ids.extend(ids)
+        self.codes.extend(codes)
+        self.times.extend(times)
+        for code in codes:
+            self.counters[code] += 1
+
+    def count(self, reason: type[Rejection] | None = None) -> int:
+        '''
+        Orders rejected so far, for one reason or in total
+        '''
+        return self.counters[reason.code] if reason is not None else len(self.ids)
+
+    def counts(self) -> Dict[str, int]:
+        return {reason.__name__: n for reason, n in zip(REASONS, self.counters) if n}
+
+    @property
+    def messages(self) -> List[str]:
+        return [REASONS[code].message for code in self.codes]
+
+
+def write_table(path: str, header: Sequence[str], columns: Sequence[Sequence], fmt: str = 'csv') -> str:
+    '''
+    Write equal-length columns under header, returns the path written
+    @param path: output path, the extension is replaced for parquet/arrow
+    @param fmt: one of csv, parquet (Parquet) or arrow (Arrow IPC file), the last two need pyarrow
+    '''
+    if fmt == 'csv':
+        with open(path, 'w', newline='', buffering=WRITE_BUFFER) as out:
+            writer = csv.writer(out)
+            writer.writerow(header)
+            writer.writerows(zip(*columns))
+
+    elif fmt in ('parquet', 'arrow'):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(f"pyarrow is required to write {fmt} reports")
+
+        path = os.path.splitext(path)[0] + ('.parquet' if fmt == 'parquet' else '.arrow')
+        table = pa.table({name: list(column) for name, column in zip(header, columns)})
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, path)
+        else:
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    else:
+        raise ValueError(f"unknown report format {fmt}, expected one of {FORMATS}")
+
+    logging.info(f"Completed report {path}.")
+    return path
+
+
+def row_columns(rows: Iterable[dict], header: Sequence[str]) -> List[list]:
+    '''
+    Report rows as dicts keyed by header, turned into one list per header field
+    '''
+    columns = [[] for _ in header]
+    for row in rows:
+        for column, field in zip(columns, header):
+            column.append(row[field])
+    return columns
+
+
+def client_columns(clients: Iterable) -> List[list]:
+    return row_columns((row for client in clients for row in client.generateReportRows()), CLIENT_HEADER)
+
+
+def instrument_columns(instruments: Iterable) -> List[list]:
+    return row_columns((instrument.generateReportRow() for instrument in instruments), INSTRUMENT_HEADER)
+
+
+def exchange_columns(orderbooks: Iterable) -> List[list]:
+    ids, reasons = [], []
+    for book in orderbooks:
+        ids.extend(book.rejections.ids)
+        reasons.extend(book.rejections.messages)
+    return [ids, reasons]
+
+
+def trade_columns(book) -> tuple:
+    '''
+    (prices, volumes, buyer codes, seller codes, clients) of the fills of one book
+    '''
+    trades = book.trades
+    if book.columnar:
+        prices = trades.price
+        if trades.tick_size:
+            prices = [price * trades.tick_size for price in prices]
+        return prices, trades.volume, trades.buyer, trades.seller, trades.clients.values
+
+    codes = {}
+    clients = []
+    def code(client):
+        if client not in codes:
+            codes[client] = len(clients)
+            clients.append(client)
+        return codes[client]
+
+    return (
+        [t.price for t in trades],
+        [t.volume for t in trades],
+        [code(t.buyer) for t in trades],
+        [code(t.seller) for t in trades],
+        clients
+    )
+
+
+def trade_summary_columns(orderbooks: Iterable) -> List[list]:
+    '''
+    Bought/sold volume and notional per instrument and client, aggregated from the fills in bulk
+    '''
+    columns = [[] for _ in TRADE_SUMMARY_HEADER]
+    np = optional_import('numpy') # optional, pure Python group-by below
+
+    for book in orderbooks:
+        prices, volumes, buyers, sellers, clients = trade_columns(book)
+        if not clients:
+            continue
+        instrument = getattr(book.instrument, 'instrumentID', book.instrument)
+
+        if np is not None:
+            volume = np.asarray(volumes, dtype=np.float64)
+            notional = np.asarray(prices, dtype=np.float64) * volume
+            buyer = np.asarray(buyers, dtype=np.int64)
+            seller = np.asarray(sellers, dtype=np.int64)
+            n = len(clients)
+            sums = [
+                np.bincount(buyer, weights=volume, minlength=n).tolist(),
+                np.bincount(seller, weights=volume, minlength=n).tolist(),
+                np.bincount(buyer, weights=notional, minlength=n).tolist(),
+                np.bincount(seller, weights=notional, minlength=n).tolist(),
+            ]
+        else:
+            sums = [[0.0] * len(clients) for _ in range(4)]
+            bought_volume, sold_volume, bought_notional, sold_notional = sums
+            for price, volume, buyer, seller in zip(prices, volumes, buyers, sellers):
+                bought_volume[buyer] += volume
+                sold_volume[seller] += volume
+                bought_notional[buyer] += price * volume
+                sold_notional[seller] += price * volume
+
+        for code, client in enumerate(clients):
+            columns[0].append(instrument)
+            columns[1].append(client.ID)
+            for column, values in zip(columns[2:], sums):
+                column.append(values[code])
+
+    return columns
+
+
+class ReportEngine:
+
+    def __init__(self, directory: str = 'reports', formats: Sequence[str] = ('csv',)) -> None:
+        '''
+        Writes the end of day reports from the columnar state of clients, instruments and books
+        @param directory: output directory
+        @param formats: any of csv, parquet, arrow
+        '''
+        for fmt in formats:
+            if fmt not in FORMATS:
+                raise ValueError(f"unknown report format {fmt}, expected one of {FORMATS}")
+            # Fail before the day is processed rather than at the end of it
+            if fmt != 'csv' and importlib.util.find_spec('pyarrow') is None:
+                raise ImportError(f"pyarrow is required to write {fmt} reports")
+        self.directory = directory
+        self.formats = formats
+
+    def write(self, name: str, header: Sequence[str], columns: Sequence[Sequence]) -> List[str]:
+        return [write_table(os.path.join(self.directory, name), header, columns, fmt) for fmt in self.formats]
+
+    def client_report(self, clients: Iterable) -> List[str]:
+        return self.write('output_client_report.csv', CLIENT_HEADER, client_columns(clients))
+
+    def instrument_report(self, instruments: Iterable) -> List[str]:
+        return self.write('output_instrument_report.csv', INSTRUMENT_HEADER, instrument_columns(instruments))
+
+    def exchange_report(self, orderbooks: Iterable) -> List[str]:
+        return self.write('output_exchange_report.csv', EXCHANGE_HEADER, exchange_columns(orderbooks))
+
+    def trade_summary(self, orderbooks: Iterable) -> List[str]:
+        return self.write('output_trade_summary.csv', TRADE_SUMMARY_HEADER, trade_summary_columns(orderbooks))
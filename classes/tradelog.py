@@ -0,0 +1,114 @@
+import datetime
+import os
+
+from collections import deque
+from typing import Iterator, List, Tuple
+
+from .clock import WALL_CLOCK
+
+
+DEFAULT_TAIL = 10000
+DEFAULT_BATCH = 1000
+
+# (wall time, buyer, buy order id, seller, sell order id, size, instrument, price)
+Record = Tuple[float, object, str, object, str, float, object, float]
+
+
+def format_record(record: Record, to_price=None) -> str:
+    ts, buyer, buy_id, seller, sell_id, size, instrument, price = record
+    if to_price is not None:
+        price = to_price(price)
+    return f"{datetime.datetime.fromtimestamp(ts)} EXECUTE: {buyer} #{buy_id} BUY {seller} #{sell_id} SELL {size} {instrument} @ {price}"
+
+
+class FileSink:
+
+    def __init__(self, path: str) -> None:
+        '''
+        Appends formatted trade log lines to a file
+        '''
+        self.path = path
+
+    def write(self, lines: List[str]) -> None:
+        # Reopened per batch, so books can be pickled to worker processes and several can share a file
+        with open(self.path, 'a') as out:
+            out.write('\n'.join(lines) + '\n')
+
+
+class RotatingFileSink(FileSink):
+
+    def __init__(self, path: str, max_bytes: int, backups: int = 5) -> None:
+        '''
+        File sink that rolls path over to path.1 ... path.<backups> once it grows past max_bytes
+        '''
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self, lines: List[str]) -> None:
+        super().write(lines)
+        if os.path.getsize(self.path) >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self) -> None:
+        for idx in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{idx}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{idx + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class TradeLog:
+
+    def __init__(self, instrument, tail: int | None = DEFAULT_TAIL, sink: FileSink | None = None, batch_size: int = DEFAULT_BATCH, ticks = None, clock = WALL_CLOCK) -> None:
+        '''
+        Human readable log of the fills of one book, records are only formatted when read or written out
+        @param tail: number of most recent fills kept in memory, None keeps all
+        @param sink: where fills are written, None keeps only the in-memory tail
+        @param batch_size: fills buffered before a write to the sink
+        @param ticks: TickScale the recorded prices are in, None if they are decimal already
+        @param clock: what fills are stamped with, a SimulatedClock in replays
+        '''
+        self.instrument = instrument
+        self.to_price = ticks.to_price if ticks is not None else None
+        self.clock = clock
+        self.tail: deque[Record] = deque(maxlen=tail)
+        self.sink = sink
+        self.batch_size = batch_size
+        self.pending: List[Record] = []
+        self.count = 0
+
+    def __len__(self) -> int:
+        return len(self.tail)
+
+    def __bool__(self) -> bool:
+        return len(self.tail) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        return (format_record(record, self.to_price) for record in self.tail)
+
+    def __getitem__(self, idx: int) -> str:
+        return format_record(self.tail[idx], self.to_price)
+
+    def add(self, buy, sell, price: float, size: float) -> None:
+        '''
+        Record one fill
+        @param buy: buying Order
+        @param sell: selling Order
+        '''
+        record = (self.clock.time(), buy.client, buy.id, sell.client, sell.id, size, self.instrument, price)
+        self.tail.append(record)
+        self.count += 1
+
+        if self.sink is not None:
+            self.pending.append(record)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.sink.write([format_record(record, self.to_price) for record in self.pending])
+            self.pending = []
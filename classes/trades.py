@@ -0,0 +1,105 @@
+import datetime
+
+from array import array
+
+from .clock import seconds_of_day, time_of_day
+from .order import Trade
+from .optional import optional_import
+
+
+
+
+class Interner:
+
+    def __init__(self) -> None:
+        '''
+        Maps objects to small integer codes, each distinct object is stored once
+        '''
+        self.values: list = []
+        self.codes: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code: int):
+        return self.values[code]
+
+
+class TradeStore:
+
+    def __init__(self, tick_size: float | None = None) -> None:
+        '''
+        Columnar trade storage, one typed array per field and no Python object per fill
+        @param tick_size: if set, prices are stored as integer ticks of this size
+        '''
+        self.tick_size = tick_size
+
+        self.price = array('q') if tick_size else array('d')
+        self.volume = array('d')
+        self.buyer = array('l')
+        self.seller = array('l')
+        self.time = array('l') # seconds since midnight
+
+        self.clients = Interner()
+
+    def __len__(self) -> int:
+        return len(self.volume)
+
+    def __bool__(self) -> bool:
+        return len(self.volume) > 0
+
+    def add(self, buyer, seller, price: float, volume: float, time: datetime.datetime) -> None:
+        '''
+        Append one fill
+        @param buyer: Client object
+        @param seller: Client object
+        @param time: event time of the fill
+        '''
+        self.price.append(round(price / self.tick_size) if self.tick_size else price)
+        self.volume.append(volume)
+        self.buyer.append(self.clients.code(buyer))
+        self.seller.append(self.clients.code(seller))
+        self.time.append(seconds_of_day(time))
+
+    def append(self, trade: Trade) -> None:
+        self.add(trade.buyer, trade.seller, trade.price, trade.volume, trade.time)
+
+    def __getitem__(self, idx: int) -> Trade:
+        '''
+        Materialise a single fill as a Trade
+        '''
+        price = self.price[idx] * self.tick_size if self.tick_size else self.price[idx]
+        return Trade(
+            self.clients[self.buyer[idx]],
+            self.clients[self.seller[idx]],
+            price,
+            self.volume[idx],
+            time_of_day(self.time[idx])
+        )
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def to_numpy(self) -> dict:
+        '''
+        Zero-copy NumPy views of the columns, keyed by field name
+        '''
+        np = optional_import('numpy') # optional, only needed here
+        if np is None:
+            raise ImportError("numpy is required for TradeStore.to_numpy")
+
+        return {
+            'price' : np.frombuffer(self.price, dtype=np.int64 if self.tick_size else np.float64),
+            'volume' : np.frombuffer(self.volume, dtype=np.float64),
+            'buyer' : np.frombuffer(self.buyer, dtype=np.dtype(f"i{self.buyer.itemsize}")),
+            'seller' : np.frombuffer(self.seller, dtype=np.dtype(f"i{self.seller.itemsize}")),
+            'time' : np.frombuffer(self.time, dtype=np.dtype(f"i{self.time.itemsize}")),
+        }
@@ -0,0 +1 @@
+# Puts the repository root on sys.path, the tests in tests/ import the engine as `classes`
@@ -1,37 +1,90 @@
-from classes.client import Client, generateClientReport
-from classes.order import Order, OrderBook, generateExchangeReport
-from classes.instrument import Instrument, generate_instrument_report
-
-from typing import List
+from classes.order import OrderBook
+from classes.exchange import Exchange
+from classes.refdata import CLIENTS_PATH, INSTRUMENTS_PATH
+from classes.ingest import DEFAULT_BUFFER_SIZE, open_orders, read_orders
+from classes.parallel import run_sharded
+from classes.gateway import serve
+from classes.journal import DEFAULT_SNAPSHOT_EVERY, Journal, Snapshotter, clear_snapshot, recover
+from classes.report import FORMATS, ReportEngine
+from classes.tradelog import FileSink, RotatingFileSink
+from classes.metrics import DEFAULT_DUMP_EVERY, Metrics, MetricsDumper
+from classes.clock import SimulatedClock
+from classes.replay import Replay
+from classes.orderfile import OrderFile, convert_orders, is_order_file
 
 import os
-import csv
 import datetime
-
-def main() -> None:
-    inputClientPath = os.path.join('classes', 'csv', 'test', 'input_clients.csv')
-    inputInstrumentPath = os.path.join('classes', 'csv', 'test', 'input_instruments.csv')
-    inputOrderPath = os.path.join('classes', 'csv', 'test', 'input_orders.csv')
-    clientData = csv.DictReader(open(inputClientPath))
-    instrumentData = csv.DictReader(open(inputInstrumentPath))
-    clients = {}
-    instruments = {}
-    orderbooks = {}
-
-    # INSTRUMENT INGESTION
-    for instrument in instrumentData:
-        instruments[instrument['InstrumentID']] = Instrument(instrument['InstrumentID'], instrument['Currency'], int(instrument['LotSize']))
-        orderbooks[instrument['InstrumentID']] = OrderBook(instrument['InstrumentID'])
-
-    # CLIENT INGESTION
-    for row in clientData:
-        newclient = Client(
-                    ID= row['ClientID'],
-                    currencies= set(row['Currencies'].split(',')),
-                    positionCheck= True if row['PositionCheck'] == 'Y' else False,
-                    rating= int(row['Rating'])
-                )
-        clients[row['ClientID']] = newclient
+import argparse
+import asyncio
+import itertools
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description='Run an order file through the order books and write the reports')
+    parser.add_argument('orders', nargs='?', default=os.path.join('classes', 'csv', 'test', 'input_orders.csv'), help="order file, CSV or binary, '-' for CSV on stdin")
+    parser.add_argument('--convert', metavar='PATH', default=None, help='write the CSV order file to PATH in the binary order format and exit')
+    parser.add_argument('--clients', default=CLIENTS_PATH)
+    parser.add_argument('--instruments', default=INSTRUMENTS_PATH)
+    parser.add_argument('--reports', default='reports', help='directory the reports are written to')
+    parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE, help='order file read buffer in bytes')
+    parser.add_argument('--columnar-trades', action='store_true', help='keep fills in a columnar TradeStore instead of Trade objects')
+    parser.add_argument('--auctions', action='store_true', help='run opening/closing call auctions instead of matching continuously outside 09:30-16:00')
+    parser.add_argument('--bar-interval', type=int, default=None, help='also write OHLCV bars of this many seconds')
+    parser.add_argument('--dense-ladder', type=int, default=None, metavar='TICKS', help='index price levels in an array this many ticks wide around the touch')
+    parser.add_argument('--batch-size', type=int, default=0, help='hand new orders to the books in batches of this many, 0 processes them one at a time')
+    parser.add_argument('--workers', type=int, default=0, help='match instruments in this many worker processes, 0 runs in-process')
+    parser.add_argument('--report-format', action='append', choices=FORMATS, help='report output format, repeat for several, parquet/arrow need pyarrow (default csv)')
+    parser.add_argument('--trade-log', default=None, help='append the trade log to this file')
+    parser.add_argument('--trade-log-max-bytes', type=int, default=None, help='rotate the trade log file once it reaches this size')
+    parser.add_argument('--trade-summary', action='store_true', help='also write bought/sold volume and notional per instrument and client')
+    parser.add_argument('--journal', default=None, help='write-ahead journal of order events and fills')
+    parser.add_argument('--snapshot', default=None, help='snapshot file, defaults to the journal path + .snapshot')
+    parser.add_argument('--snapshot-every', type=int, default=DEFAULT_SNAPSHOT_EVERY, help='order events between snapshots')
+    parser.add_argument('--recover', action='store_true', help='restore the snapshot, replay the journal and carry on from the next order of the file')
+    parser.add_argument('--metrics', metavar='PATH', default=None, help='time the matching stages and count orders/fills/rejects, dumped to PATH as JSON')
+    parser.add_argument('--metrics-every', type=float, default=DEFAULT_DUMP_EVERY, help='seconds between metrics dumps')
+    parser.add_argument('--metrics-sample', type=int, default=1, help='time the stages of every nth order only')
+    parser.add_argument('--replay', action='store_true', help='run on a simulated clock driven by the order times, checkpointing at 09:30 and 16:00')
+    parser.add_argument('--replay-speed', type=float, default=None, help='with --replay, pace the orders at this multiple of real time instead of as fast as possible')
+    parser.add_argument('--replay-date', type=datetime.date.fromisoformat, default=None, help='with --replay, trading day (YYYY-MM-DD) the order times fall on')
+    parser.add_argument('--serve', metavar='HOST:PORT', default=None, help='take orders over TCP instead of the order file, until SIGINT/SIGTERM')
+    args = parser.parse_args(argv)
+    if args.journal and args.workers:
+        parser.error('--journal is only supported in-process, without --workers')
+    if args.serve and (args.workers or args.journal):
+        parser.error('--serve cannot be combined with --workers or --journal')
+    if args.batch_size and args.journal:
+        parser.error('--batch-size cannot be combined with --journal, snapshots must fall between processed events')
+    if args.replay and (args.workers or args.serve):
+        parser.error('--replay cannot be combined with --workers or --serve')
+    if args.replay and args.batch_size:
+        parser.error('--batch-size cannot be combined with --replay, the clock must be at each order\'s time when it is processed')
+    if args.convert:
+        with open_orders(args.orders, args.buffer_size) as inf:
+            convert_orders(inf, args.convert)
+        return
+    binary = not args.serve and is_order_file(args.orders)
+    if binary and args.workers:
+        parser.error('binary order files are only read in-process, without --workers')
+
+    inputClientPath = args.clients
+    inputInstrumentPath = args.instruments
+    inputOrderPath = args.orders
+    bufferSize = args.buffer_size
+    reports = ReportEngine(args.reports, args.report_format or ('csv',))
+    if args.trade_log and args.trade_log_max_bytes:
+        logSink = RotatingFileSink(args.trade_log, args.trade_log_max_bytes)
+    else:
+        logSink = FileSink(args.trade_log) if args.trade_log else None
+    metrics = Metrics(args.metrics_sample) if args.metrics else None
+    clock = SimulatedClock(args.replay_date) if args.replay else None
+
+    # INSTRUMENT + CLIENT INGESTION
+    exchange = Exchange.load(inputClientPath, inputInstrumentPath, args.bar_interval, reports=reports, columnar_trades=args.columnar_trades, auctions=args.auctions, log_sink=logSink, dense_width=args.dense_ladder, metrics=metrics, clock=clock)
+    instruments = exchange.instruments
+    clients = exchange.clients
+    orderbooks = exchange.orderbooks
+    if args.workers and any(c.maxOrderRate is not None for c in clients.values()):
+        parser.error('--workers cannot be used with clients that have a MaxOrderRate, the limit spans all instruments')
 
     # FOR TESTING 
     # pre_orders = [
@@ -40,46 +93,62 @@ def main() -> None:
     #     Order("B1", datetime.datetime.now(), clients['B'], instruments['SIA'], False, 32.1, 4000, clients['B'].rating)
     # ]
 
-    orders: List[Order] = []
-
-    sia_inst = Instrument("SIA", "SGD", 100)
-
-    # pre_orders = [
-    #     Order("C1", datetime.datetime.now(), clients['C'], sia_inst, True, 32.0, 100, clients['C'].rating),
-    #     Order("A2", datetime.datetime.now(), clients['A'], sia_inst, True, 31.9, 800, clients['A'].rating),
-    #     Order("B1", datetime.datetime.now(), clients['B'], sia_inst, False, 32.1, 4000, clients['B'].rating)
-    # ]
-
     # for order in pre_orders:
     #     ob.process_order(order, order.rating)
 
     # print(pre_orders)
 
-    # ORDER INGESTION
-
-    with open(inputOrderPath) as inf:
-        csv_file = csv.DictReader(inf)
-
-        for line in csv_file:
-            client: Client = clients[line['Client']]
-
-            new_order = Order(
-                id=line['OrderID'],
-                time=datetime.datetime.strptime(line['Time'], "%H:%M:%S"), 
-                client=client,
-                instrument=instruments[line['Instrument']],
-                side=line["Side"] == "Buy",
-                price=line["Price"],
-                quantity=float(line["Quantity"]),
-                rating=client.rating
-            )
-
-            orders.append(new_order)
-
-    # ORDER PROCESSING
-    for order in orders:
-        ob: OrderBook = orderbooks[order.instrument.instrumentID]
-        ob.process_order(order, order.rating)
+    # JOURNAL / RECOVERY
+    journal = None
+    if args.journal:
+        snapshotPath = args.snapshot or args.journal + '.snapshot'
+        if args.recover:
+            journal = recover(snapshotPath, args.journal, clients, instruments, orderbooks, clock=clock)
+        else:
+            clear_snapshot(snapshotPath)
+            journal = Journal(args.journal)
+            journal.reset()
+            for book in orderbooks.values():
+                book.callback = journal.fill
+        snapshots = Snapshotter(snapshotPath, clients, instruments, orderbooks, args.snapshot_every)
+        snapshots.last = journal.events
+
+    # with --workers the dumps only see the merged metrics, once the workers are done
+    dumper = MetricsDumper(metrics, args.metrics, args.metrics_every) if metrics is not None else None
+    if dumper is not None:
+        dumper.start()
+
+    # ORDER INGESTION + PROCESSING, streamed row by row
+    if args.serve:
+        host, port = args.serve.rsplit(':', 1)
+        ob: OrderBook = asyncio.run(serve(host, int(port), clients, instruments, orderbooks)) or next(iter(orderbooks.values()))
+    else:
+        with OrderFile(inputOrderPath) if binary else open_orders(inputOrderPath, bufferSize) as inf:
+            if args.workers:
+                ob: OrderBook = run_sharded(inf, clients, instruments, orderbooks, args.workers)
+            else:
+                orders = inf.read_orders(clients, instruments) if binary else read_orders(inf, clients, instruments)
+                if journal is not None:
+                    # events already applied before a restart are skipped
+                    orders = itertools.islice(orders, journal.events, None)
+                if args.replay:
+                    def checkpoint(name, replay):
+                        for book in orderbooks.values():
+                            book.log.flush()
+                        if journal is not None:
+                            snapshots.take(journal)
+                    orders = Replay(orderbooks, clock, args.replay_speed, checkpoint).paced(orders)
+                if journal is not None:
+                    # journaled after pacing, so a checkpoint snapshot falls between events
+                    orders = journal.tee(orders, snapshots)
+                ob: OrderBook = exchange.run(orders, args.batch_size)
+
+    # CLOSING AUCTION
+    exchange.close()
+    if journal is not None:
+        journal.close()
+    if dumper is not None:
+        dumper.stop()
 
     open_price = ob.calculate_auction_price(ob.pre_orders)
     close_price = ob.calculate_auction_price(ob.post_orders)
@@ -89,9 +158,7 @@ def main() -> None:
         # ob.calculate_auction_price(ob.post_orders)
 
         # ob.show_book()
-    generateClientReport(clients.values())
-    generate_instrument_report(instruments.values())
-    generateExchangeReport(orderbooks.values())
+    exchange.write_reports(args.trade_summary, bars=bool(args.bar_interval))
 
 
 if __name__ == '__main__':
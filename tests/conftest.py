@@ -0,0 +1,35 @@
+import datetime
+
+import pytest
+
+from classes.client import Client
+from classes.instrument import Instrument
+from classes.order import Order, OrderBook
+
+
+@pytest.fixture
+def instrument():
+    return Instrument('X', 'SGD', 1, tickSize=0.01)
+
+
+@pytest.fixture
+def clients():
+    return {cid: Client(cid, {'SGD'}, positionCheck=False, rating=1) for cid in ('A', 'B', 'C')}
+
+
+@pytest.fixture
+def book(instrument):
+    return OrderBook('X', ticks=instrument.ticks, registry={'X': instrument})
+
+
+@pytest.fixture
+def make_order(instrument, clients):
+    '''
+    make_order(id, client, side, price, qty, at='10:00:00'), side 'Buy'/'Sell', price a decimal or "Market"
+    '''
+    def make(order_id, client, side, price, qty, at='10:00:00'):
+        hour, minute, second = map(int, at.split(':'))
+        time = datetime.datetime(1900, 1, 1, hour, minute, second)
+        client = clients[client]
+        return Order(order_id, time, client, instrument, side == 'Buy', price, qty, client.rating)
+    return make
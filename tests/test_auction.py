@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from classes import auction
+from classes.auction import uncross
+
+
+def book(seed, count=600):
+    rng = random.Random(seed)
+    buys = [(rng.choice([None] + list(range(990, 1011))), rng.randrange(1, 20) * 100) for _ in range(count)]
+    sells = [(rng.choice([None] + list(range(995, 1016))), rng.randrange(1, 20) * 100) for _ in range(count)]
+    return buys, sells
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_numpy_and_python_uncross_agree(seed, monkeypatch):
+    pytest.importorskip('numpy')
+    buys, sells = book(seed)
+    reference = 1000 + seed % 7
+
+    monkeypatch.setattr(auction, 'NUMPY_THRESHOLD', 0)
+    vectorised = uncross(buys, sells, reference)
+    monkeypatch.setattr(auction, 'NUMPY_THRESHOLD', float('inf'))
+    python = uncross(buys, sells, reference)
+
+    assert (vectorised.price, vectorised.volume, vectorised.demand, vectorised.supply) == (python.price, python.volume, python.demand, python.supply)
+    assert type(vectorised.price) is int and type(python.price) is int
+
+
+def test_one_sided_prices(monkeypatch):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr(auction, 'NUMPY_THRESHOLD', 0)
+    result = uncross([(1000, 100), (1001, 100)], [(None, 150)])
+    assert type(result.price) is int
+    assert (result.price, result.volume) == (1000, 150)
@@ -0,0 +1,89 @@
+import asyncio
+
+from classes.gateway import Gateway
+from classes.order import OrderBook
+
+
+class FakeSession:
+    def __init__(self):
+        self.lines = []
+
+    def send(self, line):
+        self.lines.append(line.strip())
+
+
+def gateway(instrument, clients):
+    book = OrderBook('X', ticks=instrument.ticks, registry={'X': instrument})
+    gw = Gateway(clients, {'X': instrument}, {'X': book})
+    book.callback = gw.fill
+    return gw, book
+
+
+def test_sessions_cannot_touch_each_others_orders(instrument, clients, make_order):
+    gw, book = gateway(instrument, clients)
+    alice, mallory = FakeSession(), FakeSession()
+
+    gw.execute(book, alice, 'New', make_order('A1', 'A', 'Buy', 10.0, 100))
+    gw.execute(book, mallory, 'Cancel', make_order('A1', 'B', 'Buy', 10.0, 0))
+    gw.execute(book, mallory, 'Amend', make_order('A1', 'B', 'Buy', 10.0, 10))
+    gw.execute(book, mallory, 'New', make_order('A1', 'B', 'Buy', 10.0, 100))
+
+    assert mallory.lines == [
+        'REJECT,A1,REJECTED - ORDER NOT FOUND',
+        'REJECT,A1,REJECTED - ORDER NOT FOUND',
+        'REJECT,A1,REJECTED - DUPLICATE ORDER ID',
+    ]
+    assert book.depth() == ([(1000, 100, 1)], [])
+
+    # the fill still goes to the order's owner
+    gw.execute(book, mallory, 'New', make_order('M1', 'C', 'Sell', 10.0, 100))
+    assert alice.lines == ['ACK,A1', 'FILL,A1,10.0,100']
+    assert mallory.lines[-2:] == ['ACK,M1', 'FILL,M1,10.0,100']
+
+
+def test_owner_can_cancel(instrument, clients, make_order):
+    gw, book = gateway(instrument, clients)
+    alice = FakeSession()
+
+    gw.execute(book, alice, 'New', make_order('A1', 'A', 'Buy', 10.0, 100))
+    gw.execute(book, alice, 'Cancel', make_order('A1', 'A', 'Buy', 10.0, 0))
+
+    assert alice.lines == ['ACK,A1', 'ACK,A1']
+    assert book.depth() == ([], [])
+    assert gw.owners == {}
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = b''
+
+    def get_extra_info(self, name):
+        return ('test', 0)
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_undecodable_line_is_rejected(instrument, clients):
+    gw, book = gateway(instrument, clients)
+
+    async def session():
+        gw.queues['X'] = asyncio.Queue()
+        reader, writer = asyncio.StreamReader(), FakeWriter()
+        reader.feed_data(b'New,10:00:00,B\xff1,X,100,A,10.00,Buy\nNew,10:00:00,A1,X,100,A,10.00,Buy\n')
+        reader.feed_eof()
+        await gw.handle(reader, writer)
+        return writer.data.decode(errors='replace'), gw.queues['X'].qsize()
+
+    sent, queued = asyncio.run(session())
+    assert sent.startswith('REJECT,B') and sent.endswith(',REJECTED - MALFORMED ORDER\n')
+    assert queued == 1 # the session carries on after the bad line
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from classes.exchange import Exchange
+from classes.ingest import dispatch, dispatch_batches, read_orders
+from classes.report import client_columns
+
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'classes', 'csv', 'test')
+
+
+def state(exchange):
+    books = {}
+    for iid, book in exchange.orderbooks.items():
+        queues = [
+            [order.id for _, order in level.queue()]
+            for ladder in (book.bid_ladder, book.offer_ladder) for level in ladder.levels.values()
+        ]
+        trades = [(trade.buyer.ID, trade.seller.ID, trade.price, trade.volume) for trade in book.trades]
+        books[iid] = (book.depth(), queues, trades, list(book.rejections), book.errors)
+    clients = {cid: (client.netPositions, client.positions, client.openSells) for cid, client in exchange.clients.items()}
+    instruments = {iid: {k: v for k, v in vars(instrument).items() if k != 'ticks'} for iid, instrument in exchange.instruments.items()}
+    return books, clients, instruments, client_columns(exchange.clients.values())
+
+
+def run(batch_size, **kwargs):
+    exchange = Exchange.load(os.path.join(DATA, 'input_clients.csv'), os.path.join(DATA, 'input_instruments.csv'), **kwargs)
+    with open(os.path.join(DATA, 'input_orders.csv')) as lines:
+        orders = read_orders(lines, exchange.clients, exchange.instruments)
+        if batch_size:
+            dispatch_batches(orders, exchange.orderbooks, batch_size)
+        else:
+            dispatch(orders, exchange.orderbooks)
+    exchange.close()
+    return state(exchange)
+
+
+@pytest.mark.parametrize('batch_size', [1, 13, 1000])
+@pytest.mark.parametrize('options', [{}, {'auctions': True}, {'dense_width': 32}])
+def test_batches_give_the_same_state(batch_size, options):
+    assert run(batch_size, **options) == run(0, **options)
+
+
+def test_batch_matches_orders_rested_earlier_in_it(book, make_order):
+    book.process_orders([
+        make_order('B1', 'A', 'Buy', 10.0, 100),
+        make_order('B2', 'B', 'Buy', 10.0, 100),
+        make_order('B3', 'A', 'Buy', 9.99, 100),
+        make_order('S1', 'C', 'Sell', 10.0, 150),
+    ])
+
+    assert [(trade.buyer.ID, trade.volume) for trade in book.trades] == [('A', 100), ('B', 50)]
+    assert book.depth() == ([(1000, 50, 1), (999, 100, 1)], [])
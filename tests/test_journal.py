@@ -0,0 +1,92 @@
+import itertools
+import os
+
+from classes.clock import SimulatedClock
+from classes.exchange import Exchange
+from classes.ingest import read_orders
+from classes.journal import Journal, Snapshotter, clear_snapshot, recover
+from classes.replay import Replay
+from classes.report import client_columns, exchange_columns, instrument_columns
+from classes.tradelog import FileSink
+
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'classes', 'csv', 'test')
+ORDERS = 3000
+
+
+def load(**kwargs):
+    return Exchange.load(os.path.join(DATA, 'input_clients.csv'), os.path.join(DATA, 'input_instruments.csv'), **kwargs)
+
+
+def orders(exchange, start=0):
+    with open(os.path.join(DATA, 'input_orders.csv')) as lines:
+        yield from itertools.islice(read_orders(lines, exchange.clients, exchange.instruments), start, ORDERS)
+
+
+def reports(exchange):
+    exchange.close()
+    return client_columns(exchange.clients.values()), instrument_columns(exchange.instruments.values()), exchange_columns(exchange.orderbooks.values())
+
+
+def journaled(exchange, path, crash_after=None):
+    '''
+    Run the orders through a journal with snapshots every 500 events, abandoning the run after crash_after of them
+    '''
+    journal = Journal(path, fsync_every=1)
+    for book in exchange.orderbooks.values():
+        book.callback = journal.fill
+    snapshots = Snapshotter(path + '.snapshot', exchange.clients, exchange.instruments, exchange.orderbooks, every=500)
+    exchange.run(itertools.islice(journal.tee(orders(exchange), snapshots), crash_after))
+    return journal
+
+
+def test_recover_gives_the_same_reports(tmp_path):
+    expected = load()
+    expected.run(orders(expected))
+
+    path = str(tmp_path / 'journal')
+    clear_snapshot(path + '.snapshot')
+    journaled(load(), path, crash_after=1700).file.close() # killed, nothing flushed past fsync_every
+    assert os.path.getsize(path + '.snapshot.history') > 0
+
+    restarted = load()
+    journal = recover(path + '.snapshot', path, restarted.clients, restarted.instruments, restarted.orderbooks)
+    assert journal.events == 1700
+    restarted.run(orders(restarted, journal.events))
+    journal.close()
+
+    assert reports(restarted) == reports(expected)
+
+
+def test_recover_keeps_the_live_books(tmp_path):
+    path = str(tmp_path / 'journal')
+    journaled(load(log_sink=FileSink(str(tmp_path / 'old.log'))), path, crash_after=1200).file.close()
+
+    restarted = load(log_sink=FileSink(str(tmp_path / 'new.log')))
+    books = dict(restarted.orderbooks)
+    sinks = {iid: book.log.sink for iid, book in books.items()}
+    recover(path + '.snapshot', path, restarted.clients, restarted.instruments, restarted.orderbooks)
+
+    assert restarted.orderbooks == books
+    assert all(book.log.sink is sinks[iid] for iid, book in restarted.orderbooks.items())
+    restarted.run(orders(restarted, 1200))
+    restarted.close()
+    assert os.path.getsize(tmp_path / 'new.log') > 0
+    assert any(book.resting for book in restarted.orderbooks.values())
+
+
+def test_recover_advances_the_replay_clock(tmp_path):
+    path = str(tmp_path / 'journal')
+    clock = SimulatedClock()
+    crashed = load(clock=clock)
+    journal = Journal(path, fsync_every=1)
+    events = list(itertools.islice(orders(crashed), 1300))
+    crashed.run(Replay(crashed.orderbooks, clock).paced(journal.tee(events)))
+    journal.file.close()
+
+    clock = SimulatedClock()
+    restarted = load(clock=clock)
+    recover(path + '.snapshot', path, restarted.clients, restarted.instruments, restarted.orderbooks, clock=clock)
+
+    assert clock.now() == max(order.time for _, order in events)
+    assert all(book.clock is clock for book in restarted.orderbooks.values())
@@ -0,0 +1,83 @@
+import datetime
+import random
+
+import pytest
+
+from classes.ladder import DenseLadder, PriceLadder, PriceLevel
+
+
+class Resting:
+    def __init__(self, order_id, quantity=1):
+        self.id = order_id
+        self.time = datetime.datetime(1900, 1, 1, 10)
+        self.quantity = quantity
+
+
+def test_cancelled_entries_do_not_pile_up():
+    level = PriceLevel()
+    level.push(1, Resting('live'))
+    for idx in range(10000):
+        level.push(1, Resting(idx))
+        level.cancel(idx)
+
+    assert len(level) == 1
+    assert len(level.heap) <= 3
+    assert level.head()[1].id == 'live'
+    assert level.total == 1
+
+
+def test_compaction_keeps_priority():
+    level = PriceLevel()
+    for idx in range(10):
+        level.push(idx % 3, Resting(idx))
+    for idx in range(0, 10, 2):
+        level.cancel(idx)
+
+    popped = [level.pop()[1].id for _ in range(len(level))]
+    assert popped == [3, 9, 1, 7, 5]
+
+
+def same(dense, sparse):
+    assert len(dense) == len(sparse)
+    assert (dense.best, dense.worst) == (sparse.best, sparse.worst)
+    assert dense.prices() == sparse.prices()
+    assert dense.depth() == sparse.depth()
+    assert dense.top(3) == sparse.top(3)
+    assert sorted(dense.sizes()) == sorted(sparse.sizes())
+
+
+@pytest.mark.parametrize('descending', [True, False])
+@pytest.mark.parametrize('seed', range(4))
+def test_dense_ladder_matches_price_ladder(descending, seed):
+    rng = random.Random(seed)
+    dense = DenseLadder(descending, width=16)
+    sparse = PriceLadder(descending)
+    mid = 1000
+    ids = 0
+
+    for _ in range(2000):
+        mid += rng.choice((-3, 0, 3)) # the touch drifts, the window has to recentre
+        roll = rng.random()
+        if roll < 0.55 or not sparse:
+            # mostly near the touch, some far outside the window
+            price = mid + (rng.randrange(-8, 9) if rng.random() < 0.9 else rng.randrange(-500, 500))
+            ids += 1
+            for ladder in (dense, sparse):
+                ladder.level(price).push(1, Resting(ids))
+        elif roll < 0.8:
+            # sweep the touch
+            price = sparse.best
+            for ladder in (dense, sparse):
+                level = ladder[price]
+                level.pop()
+                if not level:
+                    ladder.remove(price)
+        else:
+            price = rng.choice(sparse.prices())
+            order_id = next(iter(sparse[price].handles))
+            for ladder in (dense, sparse):
+                level = ladder[price]
+                level.cancel(order_id)
+                if not level:
+                    ladder.remove(price)
+        same(dense, sparse)
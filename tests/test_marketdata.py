@@ -0,0 +1,63 @@
+from classes.marketdata import DepthPublisher, delta
+
+
+def test_delta_reports_changed_and_removed_levels():
+    old = [(1000, 100), (999, 200), (998, 300)]
+    new = [(1000, 100), (999, 250), (997, 50)]
+
+    assert delta(old, new) == [(999, 250), (997, 50), (998, 0)]
+    assert delta(new, new) == []
+    assert delta(new, []) == [(1000, 0), (999, 0), (997, 0)]
+
+
+def published(book, **kwargs):
+    publisher = DepthPublisher(**kwargs)
+    messages = []
+    publisher.subscribe(messages.append)
+    publisher.attach(book)
+    return publisher, messages
+
+
+def test_every_change_published_without_an_interval(book, make_order):
+    publisher, messages = published(book)
+    book.process_order(make_order('B1', 'A', 'Buy', 10.0, 100), 1)
+    book.process_order(make_order('B2', 'B', 'Buy', 9.99, 200), 1)
+    book.cancel_order('B1')
+
+    depth = [(message['bids'], message['offers']) for message in messages if message['type'] == 'depth']
+    assert depth == [
+        ([(10.0, 100)], []),
+        ([(9.99, 200)], []),
+        ([(10.0, 0)], []), # the level left the view
+    ]
+    tops = [message['bid'] for message in messages if message['type'] == 'top']
+    assert tops == [(10.0, 100), (9.99, 200)]
+
+
+def test_updates_within_an_interval_are_conflated(book, make_order):
+    now = [0.0]
+    publisher, messages = published(book, interval=1.0, clock=lambda: now[0])
+
+    book.process_order(make_order('B1', 'A', 'Buy', 10.0, 100), 1)
+    now[0] = 0.5
+    book.process_order(make_order('B2', 'B', 'Buy', 10.0, 100), 1)
+    book.process_order(make_order('S1', 'C', 'Sell', 10.1, 300), 1)
+    assert len([m for m in messages if m['type'] == 'depth']) == 1
+
+    now[0] = 1.0
+    book.process_order(make_order('S2', 'C', 'Sell', 10.2, 100), 1)
+    depth = [m for m in messages if m['type'] == 'depth']
+    assert len(depth) == 2
+    assert depth[1]['bids'] == [(10.0, 200)]
+    assert depth[1]['offers'] == [(10.1, 300), (10.2, 100)]
+
+
+def test_snapshot_is_the_full_book(book, make_order):
+    publisher, messages = published(book, levels=1)
+    for idx, price in enumerate((10.0, 10.0, 9.99)):
+        book.process_order(make_order(f'B{idx}', 'A', 'Buy', price, 100), 1)
+
+    snapshot = publisher.snapshot(book)
+    assert snapshot == {'type': 'snapshot', 'instrument': 'X', 'bids': [(10.0, 200, 2), (9.99, 100, 1)], 'offers': []}
+    assert messages[-1] is snapshot
+    assert publisher.snapshot(book, 1)['bids'] == [(10.0, 200, 2)]
@@ -0,0 +1,51 @@
+from classes.metrics import SIZE, SUB, Histogram
+
+
+VALUES = list(range(5000)) + [int(1.07 ** n) for n in range(400)] + [(1 << bits) + d for bits in range(6, 40) for d in (-1, 0, 1)]
+
+
+def test_small_values_are_exact():
+    for value in range(2 * SUB):
+        assert Histogram.index(value) == value
+        assert Histogram.upper(value) == value
+
+
+def test_bucket_holds_the_value_within_resolution():
+    for value in VALUES:
+        idx = Histogram.index(value)
+        assert idx < SIZE - 1 # the overflow bucket starts past 2^40
+        assert Histogram.upper(idx) >= value
+        assert idx == 0 or Histogram.upper(idx - 1) < value # buckets do not overlap
+        assert Histogram.upper(idx) - value <= value / SUB
+
+
+def test_buckets_cover_every_value_in_order():
+    upper = [Histogram.upper(idx) for idx in range(SIZE - 1)]
+    assert upper == sorted(set(upper))
+    for idx in (2 * SUB, 5 * SUB + 3, SIZE - 2):
+        assert Histogram.index(upper[idx - 1] + 1) == idx
+        assert Histogram.index(upper[idx]) == idx
+
+
+def test_record_uses_the_same_buckets():
+    histogram = Histogram()
+    for value in VALUES:
+        histogram.record(value)
+    expected = [0] * SIZE
+    for value in VALUES:
+        expected[Histogram.index(value)] += 1
+    assert histogram.buckets == expected
+
+
+def test_percentiles():
+    histogram = Histogram()
+    assert histogram.percentile(50) == 0
+    for value in range(1, 1001):
+        histogram.record(value)
+
+    assert histogram.percentile(100) == 1000
+    assert histogram.percentile(0) == 1
+    for pct in (50, 90, 99):
+        exact = 1000 * pct // 100
+        assert exact <= histogram.percentile(pct) <= exact * (1 + 1 / SUB)
+    assert histogram.summary()['max'] == 1000
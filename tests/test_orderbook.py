@@ -0,0 +1,142 @@
+from classes.errors import DuplicateOrderId, OrderNotFound
+from classes.clock import parse_time
+from classes.metrics import ORDERS, Metrics
+from classes.order import OrderBook
+
+
+def test_duplicate_live_id_rejected(book, make_order, clients):
+    book.process_order(make_order('dup', 'A', 'Buy', 10.0, 100), 1)
+    duplicate = make_order('dup', 'B', 'Buy', 10.0, 100)
+    book.process_order(duplicate, 1)
+
+    assert list(book.rejections) == [('dup', DuplicateOrderId)]
+    assert book.depth() == ([(1000, 100, 1)], [])
+
+    book.process_order(make_order('S', 'C', 'Sell', 10.0, 200), 1)
+    assert sum(trade.volume for trade in book.trades) == 100
+    assert clients['A'].netPositions == {'X': 100}
+    assert 'X' not in clients['B'].netPositions
+    assert book.depth() == ([], [(1000, 100, 1)])
+
+
+def test_id_reusable_once_order_is_gone(book, make_order):
+    book.process_order(make_order('id', 'A', 'Buy', 10.0, 100), 1)
+    book.cancel_order('id')
+    book.process_order(make_order('id', 'A', 'Buy', 10.0, 50), 1)
+
+    assert len(book.rejections) == 0
+    assert book.depth() == ([(1000, 50, 1)], [])
+
+
+def test_amend_reduce_keeps_priority(book, make_order):
+    book.process_order(make_order('A1', 'A', 'Buy', 10.0, 100), 1)
+    book.process_order(make_order('B1', 'B', 'Buy', 10.0, 100), 1)
+    book.amend_order('A1', 40)
+
+    assert book.depth() == ([(1000, 140, 2)], [])
+    book.process_order(make_order('S', 'C', 'Sell', 10.0, 40), 1)
+    assert [(trade.buyer.ID, trade.volume) for trade in book.trades] == [('A', 40)]
+
+
+def test_amend_reduce_of_limit_sell_releases_position(book, make_order, clients):
+    book.process_order(make_order('S', 'A', 'Sell', 10.0, 100), 1)
+    book.amend_order('S', 30)
+
+    assert clients['A'].netPositions == {'X': -30}
+    assert book.depth() == ([], [(1000, 30, 1)])
+
+
+def test_amend_reduce_of_market_sell_in_call(instrument, make_order, clients):
+    book = OrderBook('X', ticks=instrument.ticks, auctions=True)
+    book.process_order(make_order('S', 'A', 'Sell', 'Market', 100, at='09:00:00'), 1)
+    book.amend_order('S', 40)
+
+    assert clients['A'].netPositions == {}
+    assert clients['A'].positions == {}
+    assert book.market_offers.total == 40
+
+
+def test_amend_price_is_cancel_replace(book, make_order):
+    book.process_order(make_order('A1', 'A', 'Buy', 10.0, 100), 1)
+    book.process_order(make_order('B1', 'B', 'Buy', 10.0, 100), 1)
+    book.amend_order('A1', 100, 1001)
+
+    assert book.depth() == ([(1001, 100, 1), (1000, 100, 1)], [])
+
+
+def test_order_events_counted_once(instrument, make_order):
+    metrics = Metrics()
+    book = OrderBook('X', ticks=instrument.ticks, registry={'X': instrument}, metrics=metrics)
+    book.process_order(make_order('A1', 'A', 'Buy', 10.0, 100), 1)
+    book.amend_order('A1', 100, 1001) # replace
+    book.amend_order('A1', 50) # reduce
+    book.cancel_order('A1')
+
+    assert metrics.counters['X'][ORDERS] == 4
+
+
+def test_cancel_unknown_order(book):
+    assert book.cancel_order('nope') is None
+    assert list(book.rejections) == [('nope', OrderNotFound)]
+
+
+def test_cancel_sell_releases_position(book, make_order, clients):
+    book.process_order(make_order('S', 'A', 'Sell', 10.0, 100), 1)
+    book.cancel_order('S')
+
+    assert clients['A'].netPositions == {'X': 0}
+    assert book.depth() == ([], [])
+
+
+def test_position_check_counts_market_sells_in_call(instrument, make_order, clients):
+    book = OrderBook('X', ticks=instrument.ticks, auctions=True)
+    seller = clients['A']
+    seller.positionCheck = True
+    book.process_order(make_order('B0', 'B', 'Buy', 10.0, 100, at='10:00:00'), 1)
+    book.process_order(make_order('S0', 'C', 'Sell', 10.0, 100, at='10:00:00'), 1)
+    book.process_order(make_order('A0', 'A', 'Buy', 10.0, 100, at='10:00:01'), 1)
+    book.process_order(make_order('S1', 'C', 'Sell', 10.0, 100, at='10:00:02'), 1)
+    assert seller.netPositions == {'X': 100}
+
+    for idx in range(5):
+        book.process_order(make_order(f'M{idx}', 'A', 'Sell', 'Market', 100, at='16:00:01'), 1)
+
+    assert [order_id for order_id, _ in book.rejections] == ['M1', 'M2', 'M3', 'M4']
+    assert seller.openSells == {'X': 100}
+
+    book.process_order(make_order('B1', 'B', 'Buy', 10.0, 300, at='16:00:02'), 1)
+    book.uncross()
+    assert seller.netPositions == {'X': 0}
+    assert seller.openSells == {'X': 0}
+
+
+def test_cancelled_market_sell_frees_position(instrument, make_order, clients):
+    book = OrderBook('X', ticks=instrument.ticks, auctions=True)
+    seller = clients['A']
+    seller.positionCheck = True
+    seller.updatePosition(instrument, 1000, 100)
+
+    book.process_order(make_order('M0', 'A', 'Sell', 'Market', 100, at='09:00:00'), 1)
+    book.cancel_order('M0')
+    book.process_order(make_order('M1', 'A', 'Sell', 'Market', 100, at='09:00:01'), 1)
+
+    assert len(book.rejections) == 0
+    assert seller.openSells == {'X': 100}
+
+
+def test_cancel_and_replace_update_auction_snapshots(book, make_order):
+    book.process_order(make_order('1', 'A', 'Buy', 10.0, 100, at='09:00:00'), 1)
+    book.process_order(make_order('2', 'B', 'Sell', 11.0, 100, at='09:00:00'), 1)
+    book.process_order(make_order('3', 'C', 'Buy', 9.0, 100, at='09:00:00'), 1)
+    book.amend_order('1', 200, 1050, parse_time('09:10:00'))
+    book.cancel_order('2', parse_time('09:20:00'))
+
+    assert sorted((o.id, o.price, o.quantity) for o in book.pre_orders) == [('1', 1050, 200), ('3', 900, 100)]
+
+
+def test_snapshots_stay_once_their_auction_has_passed(book, make_order):
+    book.process_order(make_order('1', 'A', 'Buy', 10.0, 100, at='09:00:00'), 1)
+    book.amend_order('1', 50, time=parse_time('09:10:00'))
+    book.cancel_order('1', parse_time('10:00:00'))
+
+    assert [(o.id, o.quantity) for o in book.pre_orders] == [('1', 50)]
@@ -0,0 +1,43 @@
+import pytest
+
+from classes.orderfile import OrderFile, convert_orders
+
+
+ROWS = [
+    'OrderID,Time,Client,Instrument,Side,Price,Quantity,Action',
+    'O1,9:00:00,A,X,Buy,10.00,100,New',
+    'O2,9:00:01,B,X,Sell,Market,200,New',
+    'O1,9:00:02,,X,Buy,,0,Cancel',
+    'O3,9:00:03,C,Y,Sell,10.01,300,New',
+]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'orders.bin')
+    assert convert_orders(ROWS, path) == 4
+    return path
+
+
+def test_ids_are_read_back(path, clients, instrument):
+    with OrderFile(path) as orders:
+        assert list(orders.orders) == ['O1', 'O2', 'O3']
+        assert list(orders.clients) == ['A', 'B', 'C']
+        assert orders.instruments[1] == 'Y'
+        with pytest.raises(IndexError):
+            orders.orders[3]
+
+        pairs = list(orders.read_orders(clients, {'X': instrument}))
+
+    assert [(action, order.id) for action, order in pairs] == [('New', 'O1'), ('New', 'O2'), ('Cancel', 'O1')]
+    assert pairs[1][1].price is None
+    assert pairs[0][1].price == 1000
+
+
+def test_close_with_a_reader_still_open(path, clients, instrument):
+    orders = OrderFile(path)
+    pairs = orders.read_orders(clients, {'X': instrument})
+    next(pairs)
+    orders.close()
+
+    assert [order.id for _, order in pairs] == ['O2', 'O1']
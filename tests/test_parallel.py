@@ -0,0 +1,12 @@
+import pytest
+
+from classes.client import Client
+from classes.order import OrderBook
+from classes.parallel import run_sharded
+
+
+def test_rate_limited_clients_are_not_sharded(instrument):
+    clients = {'A': Client('A', {'SGD'}, positionCheck=False, rating=1, maxOrderRate=1)}
+    orderbooks = {'X': OrderBook('X', ticks=instrument.ticks)}
+    with pytest.raises(ValueError, match='rate limit'):
+        run_sharded(['Time,OrderID,Instrument,Quantity,Client,Price,Side\n'], clients, {'X': instrument}, orderbooks, 2)
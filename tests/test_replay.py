@@ -0,0 +1,19 @@
+from classes.clock import SimulatedClock
+from classes.replay import Replay
+
+
+def test_checkpoints_fall_on_the_books_session_boundaries(book, make_order):
+    orders = [
+        make_order('1', 'A', 'Buy', 10.00, 100, at='09:29:59'),
+        make_order('2', 'A', 'Buy', 10.00, 100, at='09:30:00'), # still in the opening call
+        make_order('3', 'A', 'Buy', 10.00, 100, at='09:30:01'),
+        make_order('4', 'A', 'Buy', 10.00, 100, at='15:59:59'),
+        make_order('5', 'A', 'Buy', 10.00, 100, at='16:00:00'), # already in the closing call
+    ]
+    reached = {}
+    replay = Replay({'X': book}, SimulatedClock(), on_checkpoint=lambda name, replay: reached.setdefault(name, replay.events))
+
+    for _ in replay.paced(('New', order) for order in orders):
+        pass
+
+    assert reached == {'open': 2, 'close': 4}